@@ -0,0 +1,279 @@
+"""
+****************************************************************
+ Select Lines - selection algebra benchmark
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+Compares the selection algebra on Python sets of ints, as it was done before
+FidSet, with apply_operations on FidSet working sets, for a layer of 5M
+features: half of the layer is selected, then 25 drawn lines alternately add,
+filter and remove features, and the difference with the current selection is
+turned into the lists handed to QgsVectorLayer.modifySelection. Both sides
+also collect the IDs of each line as get_lines_ids receives them from the
+provider, into a set before and into a list turned into a FidSet now.
+
+get_lines_ids itself is then measured on a memory layer of short lines, with
+half of the layer selected and the same alternating drawn lines, so the 'filter'
+and 'remove' lines are tested against every feature the working set may hold.
+The same candidate bookkeeping done with Python sets, as get_lines_ids did it
+before, is measured for comparison.
+
+Every measurement runs in its own process, which generates its data, then
+times the call without any tracing and reports the peak resident memory of the
+process with its increase during the call, so the arrays of NumPy and the
+features and geometries of QGIS are counted too. Results are printed as JSON.
+
+Run with the Python interpreter that ships with QGIS:
+
+    python benchmarks/bench_fid_set.py --features 5000000 --layer-features 1000000
+"""
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import sys
+
+from bench_selection import measured, run_case_process
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ALGEBRA_CASES = ['set', 'FidSet']
+GET_LINES_IDS_CASES = ['get_lines_ids', 'set bookkeeping']
+
+
+def generate_steps(count, lines, seed):
+    """
+    Generate the initial selection and the intersecting IDs of the drawn lines.
+
+    Parameters:
+    - count (int): The number of features of the layer.
+    - lines (int): The number of drawn lines.
+    - seed (int): The random seed.
+
+    Returns:
+    - initial_ids (set): The IDs selected before the first line, as selectedFeatureIds returns them.
+    - operations (list): The operation of each drawn line.
+    - intersecting_ids (list): The IDs intersecting each drawn line, in the order the provider returns them.
+    """
+    rng = random.Random(seed)
+    initial_ids = set(rng.sample(range(count), count // 2))
+    operations = [('add', 'filter', 'remove')[i % 3] for i in range(lines)]
+    intersecting_ids = []
+    for operation in operations:
+        size = {'add': count // 25, 'filter': count * 3 // 5, 'remove': count // 50}[operation]
+        intersecting_ids.append(sorted(rng.sample(range(count), size)))
+    return initial_ids, operations, intersecting_ids
+
+
+def python_sets(initial_ids, current_ids, operations, intersecting_ids):
+    """
+    The selection algebra on Python sets.
+
+    Returns:
+    - (list, list): The IDs to select and to deselect.
+    """
+    line_sets = []
+    for fids in intersecting_ids:
+        lines_intersect_ids = set()
+        for fid in fids:
+            lines_intersect_ids.add(fid)
+        line_sets.append(lines_intersect_ids)
+
+    selected_ids = set(initial_ids)
+    for operation, lines_intersect_ids in zip(operations, line_sets):
+        if operation == 'add':
+            selected_ids = selected_ids.union(lines_intersect_ids)
+        elif operation == 'filter':
+            selected_ids = selected_ids.intersection(lines_intersect_ids)
+        else:
+            selected_ids = selected_ids.difference(lines_intersect_ids)
+    current_ids = set(current_ids)
+    return list(selected_ids - current_ids), list(current_ids - selected_ids)
+
+
+def fid_sets(fid_set, selection_engine, initial_ids, current_ids, operations, intersecting_ids):
+    """
+    The selection algebra on FidSet, as run by the plugin.
+
+    Returns:
+    - (list, list): The IDs to select and to deselect.
+    """
+    line_sets = []
+    for fids in intersecting_ids:
+        hits_list = []
+        for fid in fids:
+            hits_list.append(fid)
+        line_sets.append(fid_set.FidSet(hits_list))
+
+    selected_ids = selection_engine.apply_operations(initial_ids, operations, line_sets)
+    current_ids = fid_set.FidSet(current_ids)
+    return (selected_ids - current_ids).tolist(), (current_ids - selected_ids).tolist()
+
+
+def line_layer(count):
+    """
+    Generate a memory layer of short horizontal lines on a square grid.
+
+    Parameters:
+    - count (int): The number of features.
+
+    Returns:
+    - layer (QgsVectorLayer): The layer.
+    """
+    from qgis.core import QgsFeature, QgsGeometry, QgsPointXY, QgsVectorLayer
+
+    layer = QgsVectorLayer("LineString?crs=EPSG:3857", 'lines', 'memory')
+    columns = math.ceil(math.sqrt(count))
+    features = []
+    for i in range(count):
+        x, y = i % columns, i // columns
+        feature = QgsFeature(layer.fields())
+        feature.setGeometry(QgsGeometry.fromPolylineXY([QgsPointXY(x, y), QgsPointXY(x + 0.8, y)]))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def set_bookkeeping(initial_ids, operations, candidate_lists):
+    """
+    The candidate bookkeeping of get_lines_ids on Python sets, as it was done before FidSet.
+
+    Returns:
+    - list: The IDs handed to setFilterFids.
+    """
+    reachable_ids = frozenset(initial_ids)
+    candidate_sets = []
+    for operation, candidates in zip(operations, candidate_lists):
+        if operation == 'add':
+            candidate_ids = set(candidates)
+            reachable_ids = reachable_ids.union(candidate_ids)
+        else:
+            candidate_ids = reachable_ids
+        candidate_sets.append(candidate_ids)
+    return list(set().union(*candidate_sets))
+
+
+def algebra_case(implementation, fid_set, selection_engine, count, lines, seed):
+    """
+    Measure the selection algebra on Python sets or on FidSet.
+
+    Parameters:
+    - implementation (str): 'set' or 'FidSet'.
+    - fid_set (module): The fid_set module of the plugin.
+    - selection_engine (module): The selection engine of the plugin.
+    - count (int): The number of features of the layer.
+    - lines (int): The number of drawn lines.
+    - seed (int): The random seed.
+
+    Returns:
+    - record (dict): The measurement.
+    """
+    initial_ids, operations, intersecting_ids = generate_steps(count, lines, seed)
+    if implementation == 'set':
+        (to_select, to_deselect), wall_time, memory = measured(python_sets, initial_ids, initial_ids, operations,
+                                                               intersecting_ids)
+    else:
+        (to_select, to_deselect), wall_time, memory = measured(fid_sets, fid_set, selection_engine, initial_ids,
+                                                               initial_ids, operations, intersecting_ids)
+    return dict({'implementation': implementation, 'features': count, 'lines': lines, 'wall_time_s': wall_time,
+                 'selected': len(to_select), 'deselected': len(to_deselect)}, **memory)
+
+
+def get_lines_ids_case(implementation, selection_engine, count, lines, seed):
+    """
+    Measure get_lines_ids, or the same candidate bookkeeping on Python sets, on a memory layer.
+
+    Parameters:
+    - implementation (str): 'get_lines_ids' or 'set bookkeeping'.
+    - selection_engine (module): The selection engine of the plugin.
+    - count (int): The number of features of the layer.
+    - lines (int): The number of drawn lines.
+    - seed (int): The random seed.
+
+    Returns:
+    - record (dict): The measurement.
+    """
+    from qgis.core import QgsGeometry, QgsPointXY
+
+    layer = line_layer(count)
+    columns = math.ceil(math.sqrt(count))
+    rows = math.ceil(count / columns)
+    rng = random.Random(seed)
+    # The IDs of a memory layer start at 1
+    initial_ids = rng.sample(range(1, count + 1), count // 2)
+    operations = [('add', 'filter', 'remove')[i % 3] for i in range(lines)]
+    # Vertical drawn lines across the whole grid, each crosses one line per row
+    drawn_geometries = []
+    for _ in operations:
+        x = rng.randrange(columns) + 0.4
+        drawn_geometries.append(QgsGeometry.fromPolylineXY([QgsPointXY(x, -1), QgsPointXY(x, rows)]))
+    lookup = selection_engine.layer_candidate_lookup(layer)
+    # Build the spatial index of the layer outside of the measurement
+    lookup(drawn_geometries[0].boundingBox())
+    record = {'implementation': implementation, 'features': count, 'lines': lines}
+
+    if implementation == 'get_lines_ids':
+        stats = {'fetched': 0, 'tested': 0}
+        intersecting_ids, wall_time, memory = measured(selection_engine.get_lines_ids, layer, drawn_geometries,
+                                                       lookup, stats, None, operations, initial_ids)
+        return dict(record, wall_time_s=wall_time, fetched=stats['fetched'], tested=stats['tested'],
+                    intersecting=sum(len(ids) for ids in intersecting_ids), **memory)
+
+    candidate_lists = [lookup(geometry.boundingBox()) if operation == 'add' else None
+                       for geometry, operation in zip(drawn_geometries, operations)]
+    fetched_ids, wall_time, memory = measured(set_bookkeeping, initial_ids, operations, candidate_lists)
+    return dict(record, wall_time_s=wall_time, fetched=len(fetched_ids), **memory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--features', type=int, default=5000000)
+    parser.add_argument('--lines', type=int, default=25)
+    parser.add_argument('--layer-features', type=int, default=1000000,
+                        help="features of the layer get_lines_ids is measured on, 0 to skip it")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--case', choices=ALGEBRA_CASES + GET_LINES_IDS_CASES, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.case is None:
+        cases = ALGEBRA_CASES + (GET_LINES_IDS_CASES if args.layer_features else [])
+        results = []
+        for case in cases:
+            arguments = ['--case', case, '--features', args.features, '--lines', args.lines,
+                         '--layer-features', args.layer_features, '--seed', args.seed]
+            results.extend(run_case_process(arguments, {'implementation': case}))
+        algebra = {result['implementation']: result for result in results if result['implementation'] in ALGEBRA_CASES}
+        if any((algebra[case].get('selected'), algebra[case].get('deselected')) !=
+               (algebra['set'].get('selected'), algebra['set'].get('deselected')) for case in ALGEBRA_CASES):
+            raise RuntimeError("FidSet and set disagree")
+        print(json.dumps(results, indent=2))
+        return
+
+    # Child process measuring one case
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.core import QgsApplication
+    app = QgsApplication([], False)
+    app.initQgis()
+    try:
+        sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+        package = os.path.basename(PLUGIN_DIR)
+        fid_set = importlib.import_module(f"{package}.fid_set")
+        selection_engine = importlib.import_module(f"{package}.selection_engine")
+        if not fid_set.HAS_NUMPY:
+            print("NumPy is not installed, FidSet falls back to frozenset", file=sys.stderr)
+        if args.case in ALGEBRA_CASES:
+            record = algebra_case(args.case, fid_set, selection_engine, args.features, args.lines, args.seed)
+        else:
+            record = get_lines_ids_case(args.case, selection_engine, args.layer_features, args.lines, args.seed)
+    finally:
+        app.exitQgis()
+    print(json.dumps([record]))
+
+
+if __name__ == '__main__':
+    main()
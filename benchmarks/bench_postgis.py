@@ -0,0 +1,185 @@
+"""
+****************************************************************
+ Select Lines - PostGIS backend benchmark
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+Times the selection of a PostGIS line layer by the server side backend and by
+the generic path (the drawn line extent pushed down to the provider, the
+geometries tested in QGIS), for 1, 5 and 25 drawn lines in automatic and
+manual mode. The synthetic tables are generated on the server and kept between
+runs. Every measurement runs in its own process, see bench_selection.py, and
+the line result cache is cleared before it. Results are printed as JSON, one
+record per measurement.
+
+A throw away PostGIS server is enough, for example:
+
+    docker run -d --name select-lines-postgis -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgis/postgis:16-3.4
+
+Run with the Python interpreter that ships with QGIS:
+
+    python benchmarks/bench_postgis.py --sizes 100000 1000000
+    python benchmarks/bench_postgis.py --host db.example.org --dbname gis --user bench --password secret
+"""
+import argparse
+import json
+import math
+import os
+import tempfile
+import time
+
+from bench_selection import LINE_COUNTS, MODES, drawn_lines, import_plugin, measured, run_case_process, start_application
+
+# 'auto' lets the server answer, 'geos' forces the generic path
+ENGINES = ['auto', 'geos']
+# The warm run follows a first run in the same process, it reuses the pooled connection and the prepared statement
+RUNS = ['cold', 'warm']
+
+
+def create_table(connection, count, seed):
+    """
+    Create, or reuse, a table of random street segments with a GiST index.
+
+    Parameters:
+    - connection (psycopg2.extensions.connection): The connection to the benchmark database.
+    - count (int): The number of features.
+    - seed (int): The random seed.
+
+    Returns:
+    - table (str): The name of the table, in the public schema.
+    - extent (float): The size of the square the segments cover.
+    """
+    table = f"select_lines_bench_{count}_{seed}"
+    extent = math.sqrt(count) * 100.0
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS postgis")
+        cursor.execute("SELECT to_regclass(%s)", (f"public.{table}",))
+        if cursor.fetchone()[0] is None:
+            cursor.execute("SELECT setseed(%s)", (1 / (seed + 1),))
+            cursor.execute(f"CREATE TABLE {table} (id bigint PRIMARY KEY, name text, geom geometry(LineString, 3857))")
+            cursor.execute(f"INSERT INTO {table} SELECT i, 'line ' || i, "
+                           f"ST_MakeLine(ST_MakePoint(x, y), ST_MakePoint(x + 200 * (random() - 0.5), y + 200 * (random() - 0.5))) "
+                           f"FROM (SELECT i, random() * %s AS x, random() * %s AS y FROM generate_series(1, %s) i) p",
+                           (extent, extent, count))
+            cursor.execute(f"CREATE INDEX ON {table} USING gist (geom)")
+            cursor.execute(f"ANALYZE {table}")
+    connection.commit()
+    return table, extent
+
+
+def select_task(select_lines_task, layer, lines):
+    """
+    Run the task of select_features synchronously.
+
+    Returns:
+    - SelectLinesTask: The finished task.
+    """
+    task = select_lines_task.SelectLinesTask(layer, lines, set())
+    task.run()
+    task.finished(True)
+    return task
+
+
+def run_case(args, count, line_count, mode, engine_setting, run):
+    """
+    Measure one number of drawn lines, mode, engine and run on one table, in the current process.
+
+    Parameters:
+    - args (argparse.Namespace): The connection arguments.
+    - count (int): The number of features.
+    - line_count (int): The number of drawn lines.
+    - mode (str): 'automatic' or 'manual'.
+    - engine_setting (str): 'auto' or 'geos'.
+    - run (str): 'cold' or 'warm'.
+
+    Returns:
+    - record (dict): The measurement.
+    """
+    import psycopg2
+    from qgis.core import QgsDataSourceUri, QgsProject, QgsSettings, QgsVectorLayer
+
+    _, select_lines_task, line_cache = import_plugin()
+    connection = psycopg2.connect(host=args.host, port=args.port, dbname=args.dbname, user=args.user,
+                                  password=args.password)
+    start = time.perf_counter()
+    table, extent = create_table(connection, count, args.seed)
+    setup_time = time.perf_counter() - start
+    connection.close()
+
+    uri = QgsDataSourceUri()
+    uri.setConnection(args.host, str(args.port), args.dbname, args.user, args.password)
+    uri.setDataSource('public', table, 'geom', '', 'id')
+    layer = QgsVectorLayer(uri.uri(False), table, 'postgres')
+    if not layer.isValid():
+        raise RuntimeError(f"Could not open {table}")
+    QgsProject.instance().addMapLayer(layer)
+
+    settings = QgsSettings()
+    settings.setValue('select_lines/engine', engine_setting)
+    try:
+        lines = drawn_lines(extent, line_count, mode, args.seed)
+        if run == 'warm':
+            line_cache.clear_line_cache()
+            select_task(select_lines_task, layer, lines)
+        # Measure the engine, not the line results of the previous run
+        line_cache.clear_line_cache()
+        task, wall_time, memory = measured(select_task, select_lines_task, layer, lines)
+    finally:
+        settings.remove('select_lines/engine')
+    return dict({'dataset': 'postgis', 'features': count, 'setup_time_s': setup_time, 'operation': 'select_features',
+                 'lines': line_count, 'mode': mode, 'run': run,
+                 'engine': task.job.engine if task.job.database_backend else 'geos', 'wall_time_s': wall_time,
+                 'fetched': task.stats['fetched'], 'tested': task.stats['tested'],
+                 'selected': len(task.result_ids)}, **memory)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=5432)
+    parser.add_argument('--dbname', default='postgres')
+    parser.add_argument('--user', default='postgres')
+    parser.add_argument('--password', default='postgres')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="Write the JSON results to this file instead of the standard output")
+    parser.add_argument('--single', nargs=5, metavar=('SIZE', 'LINES', 'MODE', 'ENGINE', 'RUN'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.single:
+        # Child process measuring one case
+        size, line_count, mode, engine_setting, run = args.single
+        app = start_application(os.path.join(tempfile.gettempdir(), 'select_lines_benchmark', 'profile'))
+        try:
+            record = run_case(args, int(size), int(line_count), mode, engine_setting, run)
+        finally:
+            app.exitQgis()
+        print(json.dumps([record]))
+        return
+
+    connection = ['--host', args.host, '--port', args.port, '--dbname', args.dbname, '--user', args.user,
+                  '--password', args.password, '--seed', args.seed]
+    results = []
+    for size in args.sizes:
+        for line_count in LINE_COUNTS:
+            for mode in MODES:
+                for engine_setting in ENGINES:
+                    for run in RUNS:
+                        arguments = ['--single', size, line_count, mode, engine_setting, run] + connection
+                        results.extend(run_case_process(arguments, {
+                            'dataset': 'postgis', 'features': size, 'lines': line_count, 'mode': mode,
+                            'engine': engine_setting, 'run': run}))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
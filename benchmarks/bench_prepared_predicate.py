@@ -0,0 +1,120 @@
+"""
+****************************************************************
+ Select Lines - prepared geometry predicate benchmark
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+Measures the per feature cost of the intersects test of a drawn line against
+random line features, with the plain QgsGeometry path and with a prepared
+QgsGeometryEngine, the way get_lines_ids runs it.
+
+Run with the Python interpreter that ships with QGIS:
+
+    python benchmarks/bench_prepared_predicate.py --features 200000 --vertices 2
+"""
+import argparse
+import json
+import random
+import time
+
+from qgis.core import QgsApplication, QgsGeometry, QgsPointXY
+
+
+def random_lines(count, extent, max_length, seed):
+    """
+    Generate random two vertex line geometries.
+
+    Parameters:
+    - count (int): The number of lines.
+    - extent (float): The size of the square the lines are drawn in.
+    - max_length (float): The maximal length of each line along each axis.
+    - seed (int): The random seed.
+
+    Returns:
+    - lines (list): The QgsGeometry lines.
+    """
+    rng = random.Random(seed)
+    lines = []
+    for _ in range(count):
+        x = rng.uniform(0, extent)
+        y = rng.uniform(0, extent)
+        lines.append(QgsGeometry.fromPolylineXY([QgsPointXY(x, y),
+                                                 QgsPointXY(x + rng.uniform(-max_length, max_length),
+                                                            y + rng.uniform(-max_length, max_length))]))
+    return lines
+
+
+def drawn_line(extent, vertices):
+    """
+    Build the drawn line crossing the whole extent diagonally.
+
+    Parameters:
+    - extent (float): The size of the square the features are drawn in.
+    - vertices (int): The number of vertices of the drawn line.
+
+    Returns:
+    - geometry (QgsGeometry): The drawn line.
+    """
+    step = extent / (vertices - 1)
+    points = [QgsPointXY(i * step, i * step + (step / 4 if i % 2 else 0)) for i in range(vertices)]
+    return QgsGeometry.fromPolylineXY(points)
+
+
+def run(features, vertices, seed):
+    """
+    Time the plain and the prepared intersects test.
+
+    Parameters:
+    - features (int): The number of random features to test.
+    - vertices (int): The number of vertices of the drawn line.
+    - seed (int): The random seed.
+
+    Returns:
+    - results (dict): The timings in microseconds per feature.
+    """
+    extent = 10000.0
+    lines = random_lines(features, extent, 200.0, seed)
+    drawn_geometry = drawn_line(extent, vertices)
+
+    start = time.perf_counter()
+    plain_hits = sum(1 for line in lines if line.intersects(drawn_geometry))
+    plain_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    engine = QgsGeometry.createGeometryEngine(drawn_geometry.constGet())
+    engine.prepareGeometry()
+    prepared_hits = sum(1 for line in lines if engine.intersects(line.constGet()))
+    prepared_time = time.perf_counter() - start
+
+    if plain_hits != prepared_hits:
+        raise RuntimeError(f"Prepared engine found {prepared_hits} hits, plain path found {plain_hits}")
+
+    return {'features': features,
+            'drawn_line_vertices': vertices,
+            'hits': plain_hits,
+            'plain_us_per_feature': plain_time / features * 1e6,
+            'prepared_us_per_feature': prepared_time / features * 1e6,
+            'speedup': plain_time / prepared_time if prepared_time else None}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--features', type=int, default=200000)
+    parser.add_argument('--vertices', type=int, nargs='+', default=[2, 50, 500])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    app = QgsApplication([], False)
+    app.initQgis()
+    try:
+        results = [run(args.features, vertices, args.seed) for vertices in args.vertices]
+    finally:
+        app.exitQgis()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
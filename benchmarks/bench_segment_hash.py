@@ -0,0 +1,189 @@
+"""
+****************************************************************
+ Select Lines - segment grid benchmark
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+Compares the engines on a synthetic national highway network: multi-part
+highways of a few hundred kilometers each, with a vertex every kilometer,
+crossing a 1000 km square country, so the box of almost every highway covers a
+large part of the map. Short drawn lines of 5 km are placed at random and each
+adds the features it crosses, so every line searches the whole layer.
+
+- geos: run_selection with the per layer spatial index of the feature boxes,
+  every highway whose box touches a drawn line is read and tested with GEOS.
+- segments: the SegmentHashEngine, which only tests the segments in the grid
+  cells along each drawn line.
+- shapely: the Shapely STRtree engine, when Shapely 2 is installed.
+
+The time to build each index, the time of the selection and the number of
+selected features are printed as JSON; the engines must select the same
+features.
+
+Run with the Python interpreter that ships with QGIS:
+
+    python benchmarks/bench_segment_hash.py --highways 5000 --lines 1 5 25
+"""
+import argparse
+import importlib
+import json
+import math
+import os
+import random
+import sys
+import time
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Size of the country and distance between the vertices of a highway, in meters
+COUNTRY_SIZE = 1000000.0
+VERTEX_SPACING = 1000.0
+DRAWN_LINE_LENGTH = 5000.0
+
+
+def highway_layer(count, seed):
+    """
+    Generate a memory layer of long multi-part highways.
+
+    Parameters:
+    - count (int): The number of highways.
+    - seed (int): The random seed.
+
+    Returns:
+    - layer (QgsVectorLayer): The layer.
+    """
+    from qgis.core import QgsFeature, QgsGeometry, QgsPointXY, QgsVectorLayer
+
+    rng = random.Random(seed)
+    layer = QgsVectorLayer("MultiLineString?crs=EPSG:3857&field=name:string(20)", 'highways', 'memory')
+    features = []
+    for i in range(count):
+        x, y = rng.uniform(0, COUNTRY_SIZE), rng.uniform(0, COUNTRY_SIZE)
+        heading = rng.uniform(0, 2 * math.pi)
+        parts = []
+        for _ in range(rng.randint(2, 5)):
+            part = []
+            for _ in range(rng.randint(50, 200)):
+                heading += rng.uniform(-0.1, 0.1)
+                x += VERTEX_SPACING * math.cos(heading)
+                y += VERTEX_SPACING * math.sin(heading)
+                part.append(QgsPointXY(x, y))
+            parts.append(part)
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes([f"highway {i}"])
+        feature.setGeometry(QgsGeometry.fromMultiPolylineXY(parts))
+        features.append(feature)
+    layer.dataProvider().addFeatures(features)
+    return layer
+
+
+def drawn_lines(line_count, seed):
+    """
+    Generate short drawn lines at random places of the country, each adding what it crosses.
+
+    Parameters:
+    - line_count (int): The number of drawn lines.
+    - seed (int): The random seed.
+
+    Returns:
+    - lines (list): Tuples of drawn geometry (QgsGeometry) and operation.
+    """
+    from qgis.core import QgsGeometry, QgsPointXY
+
+    rng = random.Random(seed + 1)
+    lines = []
+    for _ in range(line_count):
+        x, y = rng.uniform(0, COUNTRY_SIZE), rng.uniform(0, COUNTRY_SIZE)
+        angle = rng.uniform(0, math.pi)
+        dx, dy = DRAWN_LINE_LENGTH / 2 * math.cos(angle), DRAWN_LINE_LENGTH / 2 * math.sin(angle)
+        lines.append((QgsGeometry.fromPolylineXY([QgsPointXY(x - dx, y - dy), QgsPointXY(x + dx, y + dy)]), 'add'))
+    return lines
+
+
+def timed(function, *args):
+    """
+    Call a function and time it.
+
+    Returns:
+    - (object, float): The result and the wall time in seconds.
+    """
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def run(highways, line_counts, seed):
+    """
+    Build the indexes of each engine and time the selection for each number of drawn lines.
+
+    Parameters:
+    - highways (int): The number of highways.
+    - line_counts (list): The numbers of drawn lines.
+    - seed (int): The random seed.
+
+    Returns:
+    - results (list): One record per engine and number of drawn lines.
+    """
+    from qgis.core import QgsProject, QgsRectangle
+
+    sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+    package = os.path.basename(PLUGIN_DIR)
+    selection_engine = importlib.import_module(f"{package}.selection_engine")
+    segment_hash = importlib.import_module(f"{package}.segment_hash")
+    shapely_engine = importlib.import_module(f"{package}.shapely_engine")
+    spatial_index = importlib.import_module(f"{package}.spatial_index")
+
+    layer = highway_layer(highways, seed)
+    QgsProject.instance().addMapLayer(layer)
+    layer_index = spatial_index.layer_spatial_index(layer)
+    version = layer_index.version
+    segment_count = sum(sum(len(part) - 1 for part in feature.geometry().asMultiPolyline())
+                        for feature in layer.getFeatures())
+
+    # The index of the feature boxes is built on the first query
+    _, geos_build = timed(layer_index.candidates, QgsRectangle(0, 0, 1, 1))
+    engines = [('geos', None, geos_build)]
+    engine, build_time = timed(segment_hash.SegmentHashEngine.from_source, layer, version)
+    engines.append(('segments', engine, build_time))
+    if shapely_engine.HAS_SHAPELY:
+        engine, build_time = timed(shapely_engine.ShapelyLayerEngine.from_source, layer, version)
+        engines.append(('shapely', engine, build_time))
+
+    results = []
+    for line_count in line_counts:
+        lines = drawn_lines(line_count, seed)
+        reference = None
+        for name, engine, build_time in engines:
+            result, wall_time = timed(selection_engine.run_selection, layer, lines, (), None, engine)
+            if reference is None:
+                reference = result.selected_ids
+            results.append({'engine': name, 'highways': highways, 'segments': segment_count, 'lines': line_count,
+                            'build_time_s': build_time, 'wall_time_s': wall_time,
+                            'fetched': result.stats['fetched'], 'tested': result.stats['tested'],
+                            'selected': len(result.selected_ids), 'same_as_geos': result.selected_ids == reference})
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--highways', type=int, default=5000)
+    parser.add_argument('--lines', type=int, nargs='+', default=[1, 5, 25])
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.core import QgsApplication
+    app = QgsApplication([], False)
+    app.initQgis()
+    try:
+        results = run(args.highways, args.lines, args.seed)
+    finally:
+        app.exitQgis()
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,449 @@
+"""
+****************************************************************
+ Select Lines - selection throughput benchmark
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+Generates synthetic line layers (grid streets, random polylines and long
+multi-part highways), writes them to the memory, shapefile and GeoPackage
+providers, and times the selection for 1, 5 and 25 drawn lines in automatic
+and manual mode:
+
+- select_features: the SelectLinesTask the dock runs, executed synchronously.
+- get_line_ids: SelectLinesDialog.get_line_ids called once per drawn line.
+
+It runs headless with an offscreen QgsApplication and a stub iface. Every
+measurement runs in its own process, which opens (or for the memory provider
+generates) the layer, then times the call without any tracing and reports the
+peak resident memory of the process with its increase during the call, which
+covers the allocations of QGIS, GEOS and NumPy as well as Python's. The line
+result cache is cleared before each measurement, since the drawn lines of a run
+repeat those of the previous one, and the cache hits and misses of the task are
+reported. Results are printed as JSON, one record per measurement.
+
+Run with the Python interpreter that ships with QGIS:
+
+    python benchmarks/bench_selection.py --sizes 10000 100000 --output results.json
+    python benchmarks/bench_selection.py --sizes 1000000 5000000 --datasets highways --providers gpkg
+"""
+import argparse
+import gc
+import importlib
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+try:
+    import resource
+except ImportError:
+    # Not available on Windows, the peak memory is then not reported
+    resource = None
+
+DATASETS = ['grid', 'random', 'highways']
+PROVIDERS = ['memory', 'shapefile', 'gpkg']
+LINE_COUNTS = [1, 5, 25]
+MODES = ['automatic', 'manual']
+OPERATIONS = ['select_features', 'get_line_ids']
+
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def peak_memory_mb():
+    """
+    Get the peak resident memory of the process.
+
+    Returns:
+    - float: The peak resident set size in MB, or None if it can not be measured.
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measured(function, *args):
+    """
+    Call a function, timing it and measuring how much it raised the peak resident memory.
+
+    The peak of a process never goes down, so only the first call measured in a process gets a
+    meaningful increase; the benchmarks run each measurement in its own process, see `run_case_process`.
+
+    Returns:
+    - result (object): The result of the function.
+    - wall_time (float): The wall time in seconds.
+    - memory (dict): 'peak_memory_mb', the peak resident memory of the process after the call, and
+      'peak_increase_mb', its increase during the call, both None if they can not be measured.
+    """
+    # Drop the garbage of the setup so it is not collected during the call
+    gc.collect()
+    before = peak_memory_mb()
+    start = time.perf_counter()
+    result = function(*args)
+    wall_time = time.perf_counter() - start
+    after = peak_memory_mb()
+    memory = {'peak_memory_mb': after, 'peak_increase_mb': None if after is None else after - before}
+    return result, wall_time, memory
+
+
+def run_case_process(arguments, record):
+    """
+    Run one measurement in a fresh process of the running benchmark script.
+
+    Parameters:
+    - arguments (list): The command line arguments of the child process.
+    - record (dict): The fields of the record reported if the child process fails.
+
+    Returns:
+    - results (list): The records the child process printed as JSON on its last line.
+    """
+    command = [sys.executable, os.path.abspath(sys.argv[0])] + [str(argument) for argument in arguments]
+    completed = subprocess.run(command, capture_output=True, text=True)
+    if completed.returncode != 0:
+        return [dict(record, error=completed.stderr.strip().splitlines()[-1:])]
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def generate_features(dataset, count, seed):
+    """
+    Generate the geometries of a synthetic line network.
+
+    Parameters:
+    - dataset (str): 'grid' (one street segment per feature), 'random' (short random polylines)
+      or 'highways' (long multi-part lines).
+    - count (int): The number of features.
+    - seed (int): The random seed.
+
+    Returns:
+    - extent (float): The size of the square the network covers.
+    - geometries (generator): The QgsGeometry of each feature.
+    """
+    from qgis.core import QgsGeometry, QgsPointXY
+
+    rng = random.Random(seed)
+    spacing = 100.0
+    if dataset == 'grid':
+        blocks = math.ceil(math.sqrt(count / 2))
+        extent = blocks * spacing
+
+        def geometries():
+            made = 0
+            for row in range(blocks + 1):
+                for column in range(blocks):
+                    for horizontal in (True, False):
+                        if made == count:
+                            return
+                        if horizontal:
+                            start = QgsPointXY(column * spacing, row * spacing)
+                            end = QgsPointXY((column + 1) * spacing, row * spacing)
+                        else:
+                            start = QgsPointXY(row * spacing, column * spacing)
+                            end = QgsPointXY(row * spacing, (column + 1) * spacing)
+                        made += 1
+                        yield QgsGeometry.fromPolylineXY([start, end])
+        return extent, geometries()
+
+    extent = math.sqrt(count) * spacing
+    if dataset == 'random':
+        def geometries():
+            for _ in range(count):
+                x, y = rng.uniform(0, extent), rng.uniform(0, extent)
+                points = [QgsPointXY(x, y)]
+                for _ in range(rng.randint(1, 9)):
+                    x += rng.uniform(-spacing, spacing)
+                    y += rng.uniform(-spacing, spacing)
+                    points.append(QgsPointXY(x, y))
+                yield QgsGeometry.fromPolylineXY(points)
+        return extent, geometries()
+
+    def geometries():
+        step = extent / 50
+        for _ in range(count):
+            parts = []
+            x, y = rng.uniform(0, extent), rng.uniform(0, extent)
+            heading = rng.uniform(0, 2 * math.pi)
+            for _ in range(rng.randint(2, 5)):
+                part = []
+                for _ in range(50):
+                    heading += rng.uniform(-0.3, 0.3)
+                    x += step * math.cos(heading)
+                    y += step * math.sin(heading)
+                    part.append(QgsPointXY(x, y))
+                parts.append(part)
+            yield QgsGeometry.fromMultiPolylineXY(parts)
+    return extent, geometries()
+
+
+def create_layer(dataset, provider, count, seed, workdir):
+    """
+    Create, or reuse from the work directory, a synthetic layer.
+
+    Parameters:
+    - dataset (str): The dataset, see `generate_features`.
+    - provider (str): 'memory', 'shapefile' or 'gpkg'.
+    - count (int): The number of features.
+    - seed (int): The random seed.
+    - workdir (str): The directory the files are written to.
+
+    Returns:
+    - layer (QgsVectorLayer): The layer.
+    - extent (float): The size of the square the network covers.
+    """
+    from qgis.core import (QgsCoordinateTransformContext, QgsFeature, QgsVectorFileWriter, QgsVectorLayer)
+
+    name = f"{dataset}_{count}_{seed}"
+    extent, geometries = generate_features(dataset, count, seed)
+    extension = {'shapefile': 'shp', 'gpkg': 'gpkg'}.get(provider)
+    path = os.path.join(workdir, f"{name}.{extension}") if extension else None
+    if path is not None and os.path.exists(path):
+        return QgsVectorLayer(path, name, 'ogr'), extent
+
+    geometry_type = 'MultiLineString' if dataset == 'highways' else 'LineString'
+    layer = QgsVectorLayer(f"{geometry_type}?crs=EPSG:3857&field=name:string(20)", name, 'memory')
+    batch = []
+    for i, geometry in enumerate(geometries):
+        feature = QgsFeature(layer.fields())
+        feature.setAttributes([f"line {i}"])
+        feature.setGeometry(geometry)
+        batch.append(feature)
+        if len(batch) == 50000:
+            layer.dataProvider().addFeatures(batch)
+            batch = []
+    layer.dataProvider().addFeatures(batch)
+    if path is None:
+        return layer, extent
+
+    options = QgsVectorFileWriter.SaveVectorOptions()
+    options.driverName = 'ESRI Shapefile' if provider == 'shapefile' else 'GPKG'
+    error = QgsVectorFileWriter.writeAsVectorFormatV3(layer, path, QgsCoordinateTransformContext(), options)
+    if error[0] != QgsVectorFileWriter.NoError:
+        raise RuntimeError(f"Could not write {path}: {error}")
+    return QgsVectorLayer(path, name, 'ogr'), extent
+
+
+def drawn_lines(extent, line_count, mode, seed):
+    """
+    Generate the drawn lines crossing the network, and their operations.
+
+    Parameters:
+    - extent (float): The size of the square the network covers.
+    - line_count (int): The number of drawn lines.
+    - mode (str): 'automatic' (first line adds, the others filter) or 'manual' (random operations).
+    - seed (int): The random seed.
+
+    Returns:
+    - lines (list): Tuples of drawn geometry (QgsGeometry) and operation.
+    """
+    from qgis.core import QgsGeometry, QgsPointXY
+
+    rng = random.Random(seed)
+    # Lines a few blocks long around the center, so successive lines overlap the same corridor
+    center = extent / 2
+    length = min(extent, 2000.0)
+    lines = []
+    for i in range(line_count):
+        x = center + rng.uniform(-length, length) / 4
+        y = center + rng.uniform(-length, length) / 4
+        angle = rng.uniform(0, math.pi)
+        dx, dy = length / 2 * math.cos(angle), length / 2 * math.sin(angle)
+        geometry = QgsGeometry.fromPolylineXY([QgsPointXY(x - dx, y - dy), QgsPointXY(x + dx, y + dy)])
+        if mode == 'automatic':
+            operation = 'add' if i == 0 else 'filter'
+        else:
+            operation = 'add' if i == 0 else rng.choice(['add', 'filter', 'remove'])
+        lines.append((geometry, operation))
+    return lines
+
+
+class StubMessageBar:
+    def pushMessage(self, *args, **kwargs):
+        pass
+
+
+class StubIface:
+    """
+    The part of QgisInterface the dock uses, for running it headless.
+    """
+
+    def __init__(self):
+        from qgis.gui import QgsMapCanvas
+        self.canvas = QgsMapCanvas()
+        self.layer = None
+
+    def mapCanvas(self):
+        return self.canvas
+
+    def activeLayer(self):
+        return self.layer
+
+    def setActiveLayer(self, layer):
+        self.layer = layer
+
+    def messageBar(self):
+        return StubMessageBar()
+
+
+def import_plugin():
+    """
+    Import the plugin package from the directory above the benchmarks.
+
+    Returns:
+    - (module, module, module): The select_lines_dialog, select_lines_task and line_cache modules.
+    """
+    sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+    package = os.path.basename(PLUGIN_DIR)
+    return (importlib.import_module(f"{package}.select_lines_dialog"),
+            importlib.import_module(f"{package}.select_lines_task"),
+            importlib.import_module(f"{package}.line_cache"))
+
+
+def select_task(select_lines_task, layer, lines):
+    """
+    Run the task of select_features synchronously.
+
+    Returns:
+    - SelectLinesTask: The finished task.
+    """
+    task = select_lines_task.SelectLinesTask(layer, lines, set())
+    task.run()
+    task.finished(True)
+    return task
+
+
+def line_ids_calls(dialog, layer, geometries):
+    """
+    Call SelectLinesDialog.get_line_ids once per drawn line.
+
+    Returns:
+    - stats (dict): The 'fetched' and 'tested' counters of all the calls.
+    """
+    stats = {'fetched': 0, 'tested': 0}
+    for geometry in geometries:
+        dialog.get_line_ids(layer, geometry, stats)
+    return stats
+
+
+def run_case(dataset, provider, count, seed, workdir, operation, line_count, mode):
+    """
+    Measure one operation, number of drawn lines and mode on one dataset, in the current process.
+
+    Parameters:
+    - dataset (str): The dataset, see `generate_features`.
+    - provider (str): 'memory', 'shapefile' or 'gpkg'.
+    - count (int): The number of features.
+    - seed (int): The random seed.
+    - workdir (str): The directory the files are written to.
+    - operation (str): 'select_features' or 'get_line_ids'.
+    - line_count (int): The number of drawn lines.
+    - mode (str): 'automatic' or 'manual'.
+
+    Returns:
+    - record (dict): The measurement.
+    """
+    from qgis.core import QgsProject
+
+    select_lines_dialog, select_lines_task, line_cache = import_plugin()
+
+    start = time.perf_counter()
+    layer, extent = create_layer(dataset, provider, count, seed, workdir)
+    setup_time = time.perf_counter() - start
+    # The layer generation is done, free what it left behind before measuring
+    gc.collect()
+    QgsProject.instance().setCrs(layer.crs())
+    QgsProject.instance().addMapLayer(layer)
+    iface = StubIface()
+    iface.setActiveLayer(layer)
+    dialog = select_lines_dialog.SelectLinesDialog(iface)
+
+    record = {'dataset': dataset, 'provider': provider, 'features': layer.featureCount(), 'setup_time_s': setup_time,
+              'operation': operation, 'lines': line_count, 'mode': mode}
+    lines = drawn_lines(extent, line_count, mode, seed)
+    # Without the results of the previous runs
+    line_cache.clear_line_cache()
+    if operation == 'select_features':
+        # The background task of select_features, run synchronously
+        task, wall_time, memory = measured(select_task, select_lines_task, layer, lines)
+        return dict(record, wall_time_s=wall_time, fetched=task.stats['fetched'], tested=task.stats['tested'],
+                    selected=len(task.result_ids), engine=task.engine, cache_hits=task.stats.get('cache_hits', 0),
+                    cache_misses=task.stats.get('cache_misses', 0), **memory)
+
+    # One get_line_ids call per drawn line
+    geometries = [geometry for geometry, _ in lines]
+    stats, wall_time, memory = measured(line_ids_calls, dialog, layer, geometries)
+    return dict(record, wall_time_s=wall_time, fetched=stats['fetched'], tested=stats['tested'], **memory)
+
+
+def start_application(profile):
+    """
+    Start an offscreen QgsApplication on a throw away profile.
+
+    Parameters:
+    - profile (str): The profile folder, it also holds the plugin index cache.
+
+    Returns:
+    - QgsApplication: The application.
+    """
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from qgis.core import QgsApplication
+    app = QgsApplication([], True, profile)
+    app.initQgis()
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000, 5000000])
+    parser.add_argument('--datasets', nargs='+', choices=DATASETS, default=DATASETS)
+    parser.add_argument('--providers', nargs='+', choices=PROVIDERS, default=PROVIDERS)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--workdir', help="Directory for the generated files, reused between runs")
+    parser.add_argument('--output', help="Write the JSON results to this file instead of the standard output")
+    parser.add_argument('--single', nargs=6, metavar=('DATASET', 'PROVIDER', 'SIZE', 'OPERATION', 'LINES', 'MODE'),
+                        help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    workdir = args.workdir or os.path.join(tempfile.gettempdir(), 'select_lines_benchmark')
+    os.makedirs(workdir, exist_ok=True)
+
+    if args.single:
+        # Child process measuring one case
+        dataset, provider, size, operation, line_count, mode = args.single
+        app = start_application(os.path.join(workdir, 'profile'))
+        try:
+            record = run_case(dataset, provider, int(size), args.seed, workdir, operation, int(line_count), mode)
+        finally:
+            app.exitQgis()
+        print(json.dumps([record]))
+        return
+
+    results = []
+    for size in args.sizes:
+        for dataset in args.datasets:
+            for provider in args.providers:
+                for line_count in LINE_COUNTS:
+                    for mode in MODES:
+                        for operation in OPERATIONS:
+                            arguments = ['--single', dataset, provider, size, operation, line_count, mode,
+                                         '--seed', args.seed, '--workdir', workdir]
+                            results.extend(run_case_process(arguments, {
+                                'dataset': dataset, 'provider': provider, 'features': size,
+                                'operation': operation, 'lines': line_count, 'mode': mode}))
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,218 @@
+"""
+****************************************************************
+ Select Lines - live hit preview
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+from qgis.core import (QgsApplication, QgsCoordinateTransform, QgsFeatureRequest, QgsFeatureSource, QgsGeometry,
+                       QgsPointXY, QgsProject, QgsWkbTypes)
+from qgis.gui import QgsRubberBand
+from qgis.PyQt.QtCore import QPointF, Qt, QTimer
+from qgis.PyQt.QtGui import QColor
+from qgis.PyQt.QtWidgets import QGraphicsSimpleTextItem
+
+from .select_lines_task import BuildIndexTask
+from .selection_engine import (layer_candidate_lookup, line_candidates, pixels_to_layer_units,
+                               prepared_geometry_engine)
+from .spatial_index import layer_spatial_index
+
+# About one refresh per displayed frame, the mouse positions in between are coalesced
+FRAME_INTERVAL_MS = 16
+
+# Above this number of candidates only a notice is shown. The candidates are searched, read and
+# tested on the GUI thread on every frame, so the bound keeps a refresh within a few milliseconds.
+MAX_PREVIEW_CANDIDATES = 200
+
+# Index or provider lookups of one refresh at most, the segments of longer lines are searched in runs
+MAX_PREVIEW_LOOKUPS = 8
+
+
+class HitPreview:
+    """
+    Highlights the features of a layer crossed by the line being drawn, with their count.
+
+    The mouse positions are only recorded as they arrive, and the preview is refreshed at most once
+    per frame for the latest one, so the preview never falls behind the cursor. Candidates come from
+    the native spatial index of the provider, or for layers without one from the cached spatial
+    index of the layer, which is built in the background the first time it is needed; the preview
+    is skipped until it is ready.
+    """
+
+    def __init__(self, canvas, layer, tolerance_px=0):
+        """
+        Initialize the preview.
+
+        Parameters:
+        - canvas (QgsMapCanvas): The map canvas the line is drawn on.
+        - layer (QgsVectorLayer): The layer whose features are previewed.
+        - tolerance_px (int): The distance within which a feature counts as crossed, in screen pixels.
+
+        Returns:
+        None
+        """
+        self.canvas = canvas
+        self.layer = layer
+        self.tolerance_px = tolerance_px
+        self.index_task = None
+
+        self.band = QgsRubberBand(canvas, QgsWkbTypes.LineGeometry)
+        self.band.setColor(QColor(255, 200, 0, 200))
+        self.band.setWidth(3)
+
+        self.label = QGraphicsSimpleTextItem()
+        self.label.setBrush(QColor(Qt.black))
+        self.label.setZValue(1000)
+        self.label.hide()
+        canvas.scene().addItem(self.label)
+
+        # Latest vertices (map CRS) and cursor position waiting for a refresh
+        self.pending = None
+        self.timer = QTimer()
+        self.timer.setSingleShot(True)
+        self.timer.setInterval(FRAME_INTERVAL_MS)
+        self.timer.timeout.connect(self.refresh)
+
+    def update(self, points, position):
+        """
+        Record the line being drawn, the preview is refreshed on the next frame.
+
+        Parameters:
+        - points (list): The vertices of the line (QgsPointXY), in the map CRS.
+        - position (QPoint): The cursor position on the canvas.
+
+        Returns:
+        None
+        """
+        self.pending = ([QgsPointXY(point) for point in points], position)
+        if not self.timer.isActive():
+            self.timer.start()
+
+    def refresh(self):
+        """
+        Highlight the features crossed by the latest recorded line and show their count.
+
+        Returns:
+        None
+        """
+        if self.pending is None:
+            return
+        points, position = self.pending
+        self.pending = None
+        if len(points) < 2:
+            self.clear()
+            return
+
+        # Only layers without a native index need the cached one, reading every geometry to build it
+        if (self.layer.hasSpatialIndex() == QgsFeatureSource.SpatialIndexNotPresent
+                and layer_spatial_index(self.layer).index is None):
+            self.build_index()
+            self.show_text(position, "Indexing...")
+            return
+
+        # Test the line in the layer CRS, where the index and the geometries are
+        drawn_geometry = QgsGeometry.fromPolylineXY(points)
+        transform = QgsCoordinateTransform(self.canvas.mapSettings().destinationCrs(), self.layer.crs(),
+                                           QgsProject.instance().transformContext())
+        drawn_geometry.transform(transform)
+        tolerance = pixels_to_layer_units(self.canvas.mapSettings(), self.layer, self.tolerance_px)
+        # Each lookup stops one ID past the bound, which is enough to tell that the line has too many
+        candidate_lookup = layer_candidate_lookup(self.layer, MAX_PREVIEW_CANDIDATES + 1)
+        candidate_ids = line_candidates(drawn_geometry, candidate_lookup, tolerance, MAX_PREVIEW_CANDIDATES,
+                                        MAX_PREVIEW_LOOKUPS)
+        if len(candidate_ids) > MAX_PREVIEW_CANDIDATES:
+            self.band.reset(QgsWkbTypes.LineGeometry)
+            self.show_text(position, f"Over {MAX_PREVIEW_CANDIDATES} candidates")
+            return
+
+        drawn_engine = prepared_geometry_engine(drawn_geometry)
+        drawn_bbox = drawn_geometry.boundingBox().buffered(tolerance)
+        hits = []
+        request = QgsFeatureRequest().setFilterFids(candidate_ids.tolist()).setNoAttributes()
+        for feature in self.layer.getFeatures(request):
+            feature_geom = feature.geometry()
+            if feature_geom.isNull() or not feature_geom.boundingBox().intersects(drawn_bbox):
+                continue
+            if tolerance > 0:
+                hit = drawn_engine.distanceWithin(feature_geom.constGet(), tolerance)
+            else:
+                hit = drawn_engine.intersects(feature_geom.constGet())
+            if hit:
+                hits.append(feature_geom)
+
+        if hits:
+            self.band.setToGeometry(QgsGeometry.collectGeometry(hits), self.layer)
+        else:
+            self.band.reset(QgsWkbTypes.LineGeometry)
+        self.show_text(position, f"{len(hits)} crossed")
+
+    def build_index(self):
+        """
+        Build the spatial index of the layer in the background, once.
+
+        Returns:
+        None
+        """
+        if self.index_task is not None:
+            return
+        self.index_task = BuildIndexTask(self.layer)
+        # Allow another attempt if the layer changed meanwhile or the task was canceled
+        self.index_task.taskCompleted.connect(self.index_task_done)
+        self.index_task.taskTerminated.connect(self.index_task_done)
+        QgsApplication.taskManager().addTask(self.index_task)
+
+    def index_task_done(self):
+        """
+        Forget the index task once it is over.
+
+        Returns:
+        None
+        """
+        self.index_task = None
+
+    def show_text(self, position, text):
+        """
+        Show the count overlay next to the cursor.
+
+        Parameters:
+        - position (QPoint): The cursor position on the canvas.
+        - text (str): The text to show.
+
+        Returns:
+        None
+        """
+        self.label.setText(text)
+        self.label.setPos(QPointF(position.x() + 12, position.y() + 12))
+        self.label.show()
+
+    def clear(self):
+        """
+        Hide the preview, e.g. once the line is drawn.
+
+        Returns:
+        None
+        """
+        self.timer.stop()
+        self.pending = None
+        self.band.reset(QgsWkbTypes.LineGeometry)
+        self.label.hide()
+
+    def remove(self):
+        """
+        Remove the preview items from the canvas, the preview can not be used afterwards.
+
+        Returns:
+        None
+        """
+        self.clear()
+        if self.index_task is not None:
+            try:
+                self.index_task.cancel()
+            except RuntimeError:
+                # Already finished and deleted by the task manager
+                pass
+            self.index_task = None
+        self.canvas.scene().removeItem(self.band)
+        self.canvas.scene().removeItem(self.label)
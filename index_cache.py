@@ -0,0 +1,309 @@
+"""
+****************************************************************
+ Select Lines - persistent packed R-tree index cache
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+import hashlib
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+
+from qgis.core import QgsApplication, QgsProviderRegistry, QgsSettings
+
+# Settings key of the size of the cache directory, in MB
+CACHE_SIZE_SETTING = 'select_lines/index_cache_size_mb'
+DEFAULT_CACHE_SIZE_MB = 1024
+
+# Bump when the file layout changes, old files then get a different key and are evicted
+CACHE_FORMAT = 1
+CACHE_SUFFIX = '.rtree'
+MAGIC = b'SLRTREE\x01'
+HEADER = struct.Struct('<8sQQQ')
+
+
+class PackedRTree:
+    """
+    Static R-tree over feature bounding boxes, packed with the Sort-Tile-Recursive method.
+
+    The tree is stored as flat arrays: the boxes of all nodes level by level, leaves first and root
+    last, and the feature IDs of the leaves. The children of a node are contiguous in the level
+    below, so no pointers are stored and the arrays can be memory mapped from a file as is.
+    """
+
+    def __init__(self, boxes, ids, level_starts, node_size, buffer=None):
+        """
+        Initialize the tree from its arrays.
+
+        Parameters:
+        - boxes (sequence): minx, miny, maxx, maxy of every node, leaves first and root last.
+        - ids (sequence): The feature ID of every leaf.
+        - level_starts (list): The index of the first node of each level, plus the total node count.
+        - node_size (int): The maximal number of children of a node.
+        - buffer (mmap.mmap): The mapped file backing the arrays, if any.
+
+        Returns:
+        None
+        """
+        self.boxes = boxes
+        self.ids = ids
+        self.level_starts = level_starts
+        self.node_size = node_size
+        self.buffer = buffer
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def build(cls, fids, bounds, node_size=16):
+        """
+        Pack a tree from feature bounding boxes.
+
+        Parameters:
+        - fids (array): The feature IDs, array('q').
+        - bounds (array): minx, miny, maxx, maxy of each feature, array('d').
+        - node_size (int): The maximal number of children of a node.
+
+        Returns:
+        - PackedRTree: The tree.
+        """
+        count = len(fids)
+        if count == 0:
+            return cls(array('d'), array('q'), [0, 0], node_size)
+
+        # Sort-Tile-Recursive: vertical slices ordered by x, each ordered by y
+        center_x = [bounds[4 * i] + bounds[4 * i + 2] for i in range(count)]
+        center_y = [bounds[4 * i + 1] + bounds[4 * i + 3] for i in range(count)]
+        order = sorted(range(count), key=center_x.__getitem__)
+        leaf_nodes = math.ceil(count / node_size)
+        slice_size = math.ceil(math.sqrt(leaf_nodes)) * node_size
+        sorted_order = []
+        for start in range(0, count, slice_size):
+            tile = order[start:start + slice_size]
+            tile.sort(key=center_y.__getitem__)
+            sorted_order.extend(tile)
+        del center_x, center_y, order
+
+        ids = array('q', (fids[i] for i in sorted_order))
+        boxes = array('d')
+        for i in sorted_order:
+            boxes.extend(bounds[4 * i:4 * i + 4])
+
+        # Group consecutive nodes into parents until a single root remains
+        level_starts = [0, count]
+        level_start, level_end = 0, count
+        while level_end - level_start > 1:
+            for start in range(level_start, level_end, node_size):
+                end = min(start + node_size, level_end)
+                children = boxes[4 * start:4 * end]
+                boxes.extend((min(children[0::4]), min(children[1::4]), max(children[2::4]), max(children[3::4])))
+            level_start, level_end = level_end, len(boxes) // 4
+            level_starts.append(level_end)
+        return cls(boxes, ids, level_starts, node_size)
+
+    def query(self, minx, miny, maxx, maxy, limit=None):
+        """
+        Get the IDs of the features whose bounding box intersects a rectangle.
+
+        Parameters:
+        - minx, miny, maxx, maxy (float): The search rectangle.
+        - limit (int): Optional number of IDs after which the search stops.
+
+        Returns:
+        - ids (list): The IDs of the candidate features.
+        """
+        results = []
+        if not len(self.ids):
+            return results
+        boxes = self.boxes
+        level_starts = self.level_starts
+        node_size = self.node_size
+        stack = [(level_starts[-1] - 1, len(level_starts) - 2)]
+        while stack:
+            node, level = stack.pop()
+            i = 4 * node
+            if boxes[i] > maxx or boxes[i + 1] > maxy or boxes[i + 2] < minx or boxes[i + 3] < miny:
+                continue
+            if level == 0:
+                results.append(self.ids[node])
+                if len(results) == limit:
+                    break
+                continue
+            first_child = level_starts[level - 1] + (node - level_starts[level]) * node_size
+            last_child = min(first_child + node_size, level_starts[level])
+            stack.extend((child, level - 1) for child in range(first_child, last_child))
+        return results
+
+    def save(self, path):
+        """
+        Write the tree to a file, atomically.
+
+        Parameters:
+        - path (str): The path of the file.
+
+        Returns:
+        None
+        """
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, len(self.ids), self.node_size, len(self.level_starts)))
+            f.write(struct.pack(f'<{len(self.level_starts)}Q', *self.level_starts))
+            f.write(array('d', self.boxes).tobytes())
+            f.write(array('q', self.ids).tobytes())
+        os.replace(temporary_path, path)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Memory map a tree written by `save`, without reading the arrays.
+
+        Parameters:
+        - path (str): The path of the file.
+
+        Returns:
+        - PackedRTree: The tree, or None if the file can not be used.
+        """
+        if sys.byteorder != 'little':
+            # The arrays are stored little endian and mapped as is
+            return None
+        try:
+            with open(path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+        try:
+            magic, count, node_size, level_count = HEADER.unpack_from(buffer, 0)
+            if magic != MAGIC:
+                raise ValueError(path)
+            offset = HEADER.size
+            level_starts = list(struct.unpack_from(f'<{level_count}Q', buffer, offset))
+            offset += 8 * level_count
+            view = memoryview(buffer)
+            boxes = view[offset:offset + 32 * level_starts[-1]].cast('d')
+            offset += 32 * level_starts[-1]
+            ids = view[offset:offset + 8 * count].cast('q')
+            if len(ids) != count:
+                raise ValueError(path)
+        except (struct.error, ValueError, TypeError):
+            buffer.close()
+            return None
+        return cls(boxes, ids, level_starts, node_size, buffer)
+
+
+def cache_directory():
+    """
+    Get the index cache directory under the QGIS profile, creating it if needed.
+
+    Returns:
+    - path (str): The cache directory.
+    """
+    path = os.path.join(QgsApplication.qgisSettingsDirPath(), 'select_lines', 'index_cache')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def layer_cache_key(layer):
+    """
+    Get the key of the cached index of a file based layer.
+
+    The key covers the layer source URI, its subset string and the modification time and size
+    of the file, and of the write-ahead log next to it for SQLite based formats.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer.
+
+    Returns:
+    - key (str): The key, or None if the layer is not read from a local file.
+    """
+    path = QgsProviderRegistry.instance().decodeUri(layer.providerType(), layer.source()).get('path')
+    if not path or not os.path.isfile(path):
+        return None
+    parts = [str(CACHE_FORMAT), layer.providerType(), layer.source(), layer.subsetString()]
+    for file_path in (path, f"{path}-wal"):
+        if os.path.exists(file_path):
+            file_stat = os.stat(file_path)
+            parts.extend((str(file_stat.st_mtime_ns), str(file_stat.st_size)))
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def load_cached_tree(key):
+    """
+    Load a cached tree and mark it as recently used.
+
+    Parameters:
+    - key (str): The key from `layer_cache_key`.
+
+    Returns:
+    - PackedRTree: The tree, or None if there is no usable cache.
+    """
+    path = os.path.join(cache_directory(), key + CACHE_SUFFIX)
+    if not os.path.exists(path):
+        return None
+    tree = PackedRTree.load(path)
+    if tree is not None:
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+    return tree
+
+
+def store_cached_tree(key, tree):
+    """
+    Write a tree to the cache, then evict the least recently used files above the cache size.
+
+    Parameters:
+    - key (str): The key from `layer_cache_key`.
+    - tree (PackedRTree): The tree to store.
+
+    Returns:
+    None
+    """
+    directory = cache_directory()
+    try:
+        tree.save(os.path.join(directory, key + CACHE_SUFFIX))
+    except OSError:
+        return
+    max_bytes = QgsSettings().value(CACHE_SIZE_SETTING, DEFAULT_CACHE_SIZE_MB, type=int) * 1024 * 1024
+    evict_cache(directory, max_bytes, keep=key + CACHE_SUFFIX)
+
+
+def evict_cache(directory, max_bytes, keep=None):
+    """
+    Remove the least recently used index files until the directory fits in a size.
+
+    Parameters:
+    - directory (str): The cache directory.
+    - max_bytes (int): The maximal total size of the index files.
+    - keep (str): A file name that is never removed.
+
+    Returns:
+    None
+    """
+    entries = []
+    for name in os.listdir(directory):
+        if not name.endswith(CACHE_SUFFIX):
+            continue
+        try:
+            file_stat = os.stat(os.path.join(directory, name))
+        except OSError:
+            continue
+        entries.append((file_stat.st_mtime, file_stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        if name == keep:
+            continue
+        try:
+            os.remove(os.path.join(directory, name))
+            total -= size
+        except OSError:
+            # Still mapped by a running session on some platforms
+            pass
@@ -0,0 +1,210 @@
+"""
+****************************************************************
+ Select Lines - per line intersection result cache
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+
+from qgis.core import QgsSettings
+
+from .fid_set import FidSet
+from .spatial_index import layer_spatial_index
+
+# Settings key of the number of feature IDs the cache may hold
+CACHE_SIZE_SETTING = 'select_lines/line_cache_size'
+DEFAULT_CACHE_SIZE = 5000000
+
+
+class LineResultCache:
+    """
+    Least recently used cache of the IDs intersecting a drawn line.
+
+    An entry holds the intersecting IDs and the IDs the line was tested against: None for an 'add'
+    line, which is tested against the whole layer, or the working set of a 'filter' or 'remove'
+    line. A 'filter' or 'remove' entry can only answer a later line whose working set it covers.
+    The size is bounded by the total number of IDs held, and the cache is shared by the background
+    tasks, so it is guarded by a lock.
+    """
+
+    def __init__(self, max_ids):
+        """
+        Initialize the cache.
+
+        Parameters:
+        - max_ids (int): The maximal number of IDs held by all the entries.
+
+        Returns:
+        None
+        """
+        self.max_ids = max_ids
+        self.entries = OrderedDict()
+        self.size = 0
+        self.lock = threading.Lock()
+
+    def get(self, key, universe):
+        """
+        Get the IDs intersecting a line, if they were computed for a large enough set of features.
+
+        Parameters:
+        - key (tuple): The key of the line, see `LayerLineResults.key`.
+        - universe (FidSet): The IDs the line has to be tested against, None for the whole layer.
+
+        Returns:
+        - hits (FidSet): The intersecting IDs, or None on a miss.
+        """
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            hits, tested = entry
+            if tested is not None and (universe is None or not universe <= tested):
+                return None
+            self.entries.move_to_end(key)
+            return hits
+
+    def put(self, key, hits, universe):
+        """
+        Store the IDs intersecting a line and evict the least recently used entries above the size.
+
+        Parameters:
+        - key (tuple): The key of the line, see `LayerLineResults.key`.
+        - hits (FidSet): The intersecting IDs.
+        - universe (FidSet): The IDs the line was tested against, None for the whole layer.
+
+        Returns:
+        None
+        """
+        entry = (FidSet(hits), None if universe is None else FidSet(universe))
+        entry_size = len(entry[0]) + (len(entry[1]) if entry[1] is not None else 0)
+        if entry_size > self.max_ids:
+            return
+        with self.lock:
+            previous = self.entries.pop(key, None)
+            if previous is not None:
+                self.size -= self.entry_size(previous)
+            self.entries[key] = entry
+            self.size += entry_size
+            while self.size > self.max_ids:
+                _, evicted = self.entries.popitem(last=False)
+                self.size -= self.entry_size(evicted)
+
+    def entry_size(self, entry):
+        hits, tested = entry
+        return len(hits) + (len(tested) if tested is not None else 0)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.size = 0
+
+
+class LayerLineResults:
+    """
+    The view of the line cache for one layer at one version of its data.
+
+    It is created on the main thread and then used by a background task; the hit and miss counts
+    of the task are kept in `hits` and `misses`.
+    """
+
+    def __init__(self, cache, layer_id, version, tolerance=0.0):
+        """
+        Initialize the view.
+
+        Parameters:
+        - cache (LineResultCache): The cache.
+        - layer_id (str): The ID of the layer.
+        - version (int): The version counter of the layer data.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        None
+        """
+        self.cache = cache
+        self.layer_id = layer_id
+        self.version = version
+        self.tolerance = tolerance
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, drawn_geometry):
+        """
+        Get the cache key of a drawn line.
+
+        Parameters:
+        - drawn_geometry (QgsGeometry): The line, in the layer CRS.
+
+        Returns:
+        - key (tuple): The layer ID, the layer version, the tolerance and the hash of the line WKB.
+        """
+        return (self.layer_id, self.version, self.tolerance, hashlib.sha1(bytes(drawn_geometry.asWkb())).digest())
+
+    def get(self, drawn_geometry, universe=None):
+        """
+        Get the IDs intersecting a line and count the hit or the miss.
+
+        Parameters:
+        - drawn_geometry (QgsGeometry): The line, in the layer CRS.
+        - universe (FidSet): The IDs the line has to be tested against, None for the whole layer.
+
+        Returns:
+        - hits (FidSet): The intersecting IDs, or None on a miss.
+        """
+        hits = self.cache.get(self.key(drawn_geometry), universe)
+        if hits is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return hits
+
+    def put(self, drawn_geometry, hits, universe=None):
+        """
+        Store the IDs intersecting a line.
+
+        Parameters:
+        - drawn_geometry (QgsGeometry): The line, in the layer CRS.
+        - hits (FidSet): The intersecting IDs.
+        - universe (FidSet): The IDs the line was tested against, None for the whole layer.
+
+        Returns:
+        None
+        """
+        self.cache.put(self.key(drawn_geometry), hits, universe)
+
+
+_line_cache = None
+
+
+def layer_line_results(layer, tolerance=0.0):
+    """
+    Get the view of the line cache for the current data of a layer, on the main thread.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer.
+    - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+    Returns:
+    - LayerLineResults: The view.
+    """
+    global _line_cache
+    if _line_cache is None:
+        _line_cache = LineResultCache(QgsSettings().value(CACHE_SIZE_SETTING, DEFAULT_CACHE_SIZE, type=int))
+    return LayerLineResults(_line_cache, layer.id(), layer_spatial_index(layer).version, tolerance)
+
+
+def clear_line_cache():
+    """
+    Drop all cached line results, used when the plugin is unloaded.
+
+    Returns:
+    None
+    """
+    global _line_cache
+    if _line_cache is not None:
+        _line_cache.clear()
+    _line_cache = None
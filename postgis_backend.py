@@ -0,0 +1,329 @@
+"""
+****************************************************************
+ Select Lines - PostGIS backend
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+For PostGIS layers the whole sequence of drawn lines is evaluated by the
+server as one query. Each line is an ST_Intersects test, which uses the GiST
+index of the geometry column, and the lines are chained with UNION (add),
+INTERSECT (filter) and EXCEPT (remove), parenthesized so they apply in drawing
+order. Only the primary keys of the selected features are returned.
+
+Connections are pooled per database and each query shape is prepared once per
+connection, so later clicks only send the drawn lines.
+"""
+import hashlib
+import threading
+
+from qgis.core import QgsApplication, QgsAuthMethodConfig, QgsDataSourceUri
+
+from .fid_set import FidSet
+from .selection_engine import SelectionResult
+from .shapely_engine import geometry_wkb
+
+try:
+    import psycopg2
+    import psycopg2.extensions
+    import psycopg2.pool
+    HAS_PSYCOPG2 = True
+except ImportError:
+    HAS_PSYCOPG2 = False
+
+COMPOUND_OPERATORS = {'add': 'UNION', 'filter': 'INTERSECT', 'remove': 'EXCEPT'}
+
+# Lines sent in a single query, longer sequences continue from the IDs of the previous query
+MAX_COMPOUND_STEPS = 250
+
+# Connections kept open per database
+MAX_POOL_CONNECTIONS = 4
+
+# Prepared statements kept per connection before they are all deallocated
+MAX_PREPARED_STATEMENTS = 64
+
+# Integer types QGIS uses as feature IDs as they are
+INTEGER_TYPES = ('smallint', 'integer', 'bigint')
+
+
+class PostgisBackendUnavailable(Exception):
+    """
+    Raised when a layer can not be answered by the server, the generic path is used instead.
+    """
+
+
+if HAS_PSYCOPG2:
+    class PreparingConnection(psycopg2.extensions.connection):
+        """
+        Connection remembering the statements prepared in its session.
+        """
+
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            self.prepared = set()
+            self.autocommit = True
+
+
+# Connection pools per connection string
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def connection_pool(dsn):
+    """
+    Get the connection pool of a database, creating it if needed.
+
+    Parameters:
+    - dsn (str): The libpq connection string.
+
+    Returns:
+    - psycopg2.pool.ThreadedConnectionPool: The pool.
+    """
+    with _pools_lock:
+        pool = _pools.get(dsn)
+        if pool is None:
+            pool = psycopg2.pool.ThreadedConnectionPool(0, MAX_POOL_CONNECTIONS, dsn,
+                                                        connection_factory=PreparingConnection)
+            _pools[dsn] = pool
+        return pool
+
+
+def close_postgis_pools():
+    """
+    Close all pooled connections, used when the plugin is unloaded.
+
+    Returns:
+    None
+    """
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.closeall()
+        _pools.clear()
+
+
+def quote_identifier(name):
+    """
+    Quote a schema, table or column name for PostgreSQL.
+
+    Parameters:
+    - name (str): The name.
+
+    Returns:
+    - quoted (str): The quoted name.
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class PostgisSelectionBackend:
+    """
+    Runs the drawn lines of a PostGIS layer on the server.
+    """
+
+    def __init__(self, dsn, schema, table, geometry_column, key_column, subset, srid):
+        """
+        Initialize the backend.
+
+        Parameters:
+        - dsn (str): The libpq connection string.
+        - schema (str): The schema of the table.
+        - table (str): The table of the layer.
+        - geometry_column (str): The geometry column.
+        - key_column (str): The integer primary key, used as feature ID by QGIS.
+        - subset (str): The subset string of the layer, a WHERE clause, or ''.
+        - srid (int): The SRID of the geometry column as declared in the layer source, 0 if unknown.
+
+        Returns:
+        None
+        """
+        self.dsn = dsn
+        self.schema = schema
+        self.table = table
+        self.geometry_column = geometry_column
+        self.key_column = key_column
+        self.subset = subset
+        self.srid = srid
+        # The SELECT of one drawn line for each tolerance used
+        self.line_sqls = {}
+
+    def table_sql(self, cursor, tolerance=0.0):
+        """
+        Build the SELECT answering one drawn line, after checking the key and reading the SRID.
+
+        With a tolerance ST_DWithin replaces ST_Intersects; it searches the GiST index with the box of
+        the drawn line grown by the tolerance, and never buffers the features.
+
+        Parameters:
+        - cursor (psycopg2.extensions.cursor): A cursor on the database.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        - sql (str): The SELECT, with a {} placeholder for the parameter number of the drawn line WKB.
+        """
+        cursor.execute("SELECT format_type(a.atttypid, a.atttypmod) FROM pg_attribute a "
+                       "WHERE a.attrelid = to_regclass(%s) AND a.attname = %s",
+                       (f"{quote_identifier(self.schema)}.{quote_identifier(self.table)}", self.key_column))
+        row = cursor.fetchone()
+        if row is None or row[0] not in INTEGER_TYPES:
+            raise PostgisBackendUnavailable(f"{self.table} has no integer key column {self.key_column}")
+        srid = self.srid
+        if not srid:
+            cursor.execute("SELECT Find_SRID(%s, %s, %s)", (self.schema, self.table, self.geometry_column))
+            srid = cursor.fetchone()[0]
+
+        table = f"{quote_identifier(self.schema)}.{quote_identifier(self.table)}"
+        geometry = f"t.{quote_identifier(self.geometry_column)}"
+        drawn = f"ST_GeomFromWKB(${{}}, {int(srid)})"
+        if tolerance > 0:
+            predicate = f"ST_DWithin({geometry}, {drawn}, {float(tolerance)!r})"
+        else:
+            predicate = f"ST_Intersects({geometry}, {drawn})"
+        sql = f"SELECT t.{quote_identifier(self.key_column)}::bigint FROM {table} t WHERE {predicate}"
+        if self.subset:
+            sql += f" AND ({self.subset})"
+        # Escape the braces of the subset string, only the parameter placeholder is formatted
+        return sql.replace('{', '{{').replace('}', '}}').replace('${{}}', '${}')
+
+    def statement(self, connection, line_sql, operations):
+        """
+        Prepare the query of a sequence of operations on a connection, once per connection.
+
+        Parameters:
+        - connection (PreparingConnection): The connection.
+        - line_sql (str): The SELECT of one drawn line, see `table_sql`.
+        - operations (tuple): The operations of the drawn lines.
+
+        Returns:
+        - name (str): The name of the prepared statement.
+        """
+        shape = '|'.join((line_sql,) + operations)
+        name = 'select_lines_' + hashlib.sha1(shape.encode('utf-8')).hexdigest()[:16]
+        if name in connection.prepared:
+            return name
+        if len(connection.prepared) >= MAX_PREPARED_STATEMENTS:
+            connection.cursor().execute("DEALLOCATE ALL")
+            connection.prepared.clear()
+
+        # ((initial UNION line 1) INTERSECT line 2) EXCEPT line 3, INTERSECT would bind first otherwise
+        sql = "SELECT unnest($1::bigint[])"
+        for i, operation in enumerate(operations, start=2):
+            sql = f"({sql}) {COMPOUND_OPERATORS[operation]} ({line_sql.format(i)})"
+        parameter_types = ', '.join(['bigint[]'] + ['bytea'] * len(operations))
+        connection.cursor().execute(f"PREPARE {name} ({parameter_types}) AS {sql}")
+        connection.prepared.add(name)
+        return name
+
+    def run_selection(self, steps, initial_ids=(), feedback=None, history=None, tolerance=0.0):
+        """
+        Apply a sequence of drawn lines and their operations on the server.
+
+        Parameters:
+        - steps (list): Tuples of drawn geometry (QgsGeometry, in the layer CRS) and operation
+          ('add', 'filter' or 'remove'), in order.
+        - initial_ids (iterable): The IDs selected before the first step.
+        - feedback (QgsFeedback): Optional feedback for progress reports and cancellation.
+        - history (SelectionHistory): Optional history the IDs selected after each step are appended
+          to, each line is then sent as its own query.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        - SelectionResult: The selected IDs. The server only returns the final set, so there are
+          no per step statistics.
+
+        Raises:
+        - PostgisBackendUnavailable: If the layer can not be answered by the server.
+        """
+        try:
+            pool = connection_pool(self.dsn)
+            connection = pool.getconn()
+        except psycopg2.Error as e:
+            raise PostgisBackendUnavailable(f"can not connect: {e}")
+
+        broken = False
+        # Cancel the running query from the thread canceling the feedback
+        cancel = connection.cancel
+        if feedback is not None:
+            feedback.canceled.connect(cancel)
+        try:
+            cursor = connection.cursor()
+            line_sql = self.line_sqls.get(tolerance)
+            if line_sql is None:
+                line_sql = self.line_sqls[tolerance] = self.table_sql(cursor, tolerance)
+            selected_ids = FidSet(initial_ids)
+            chunk_size = 1 if history is not None else MAX_COMPOUND_STEPS
+            for start in range(0, len(steps), chunk_size):
+                chunk = steps[start:start + chunk_size]
+                name = self.statement(connection, line_sql, tuple(operation for _, operation in chunk))
+                parameters = [selected_ids.tolist()] + [psycopg2.Binary(geometry_wkb(drawn_geometry))
+                                                       for drawn_geometry, _ in chunk]
+                cursor.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(parameters))})", parameters)
+                previous_ids = selected_ids
+                selected_ids = FidSet(fid for fid, in cursor)
+                if history is not None:
+                    history.append(selected_ids, previous_ids)
+                if feedback is not None:
+                    feedback.setProgress(100 * min(start + chunk_size, len(steps)) / len(steps))
+        except psycopg2.extensions.QueryCanceledError:
+            return SelectionResult(None, [], {'fetched': 0, 'tested': 0}, True)
+        except (psycopg2.OperationalError, psycopg2.InterfaceError) as e:
+            # The connection is lost, it is not handed back to the pool
+            broken = True
+            raise PostgisBackendUnavailable(str(e))
+        except psycopg2.Error as e:
+            raise PostgisBackendUnavailable(str(e))
+        finally:
+            if feedback is not None:
+                feedback.canceled.disconnect(cancel)
+            pool.putconn(connection, close=broken or connection.closed)
+        # The features were tested on the server, only the selected IDs were fetched
+        return SelectionResult(selected_ids, [], {'fetched': len(selected_ids), 'tested': 0})
+
+
+def connection_string(uri):
+    """
+    Build the libpq connection string of a layer, resolving its authentication configuration.
+
+    Parameters:
+    - uri (QgsDataSourceUri): The data source of the layer.
+
+    Returns:
+    - dsn (str): The connection string.
+    """
+    username, password = uri.username(), uri.password()
+    if uri.authConfigId():
+        config = QgsAuthMethodConfig()
+        QgsApplication.authManager().loadAuthenticationConfig(uri.authConfigId(), config, True)
+        username = config.config('username') or username
+        password = config.config('password') or password
+
+    parts = {'service': uri.service(), 'host': uri.host(), 'port': uri.port(), 'dbname': uri.database(),
+             'user': username, 'password': password}
+    if uri.sslMode() != QgsDataSourceUri.SslPrefer:
+        parts['sslmode'] = QgsDataSourceUri.encodeSslMode(uri.sslMode())
+    return ' '.join("{}='{}'".format(key, str(value).replace('\\', '\\\\').replace("'", "\\'"))
+                    for key, value in parts.items() if value)
+
+
+def postgis_backend_for_layer(layer):
+    """
+    Get the PostGIS backend of a layer, on the main thread.
+
+    Tables of the postgres provider with a single integer key column qualify, unless the layer has
+    unsaved edits, which the server does not see, or psycopg2 is not installed.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer.
+
+    Returns:
+    - PostgisSelectionBackend: The backend, or None if the layer has to use the generic path.
+    """
+    if not HAS_PSYCOPG2 or layer.providerType() != 'postgres' or layer.isModified():
+        return None
+    uri = QgsDataSourceUri(layer.source())
+    key_column = uri.keyColumn().strip('"')
+    if not uri.table() or uri.table().startswith('(') or not key_column or ',' in key_column:
+        return None
+    srid = int(uri.srid()) if uri.srid().isdigit() else 0
+    return PostgisSelectionBackend(connection_string(uri), uri.schema() or 'public', uri.table(), uri.geometryColumn(),
+                                   key_column, layer.subsetString(), srid)
@@ -0,0 +1,31 @@
+"""
+****************************************************************
+ Select Lines - Processing provider
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+from qgis.core import QgsProcessingProvider
+from qgis.PyQt.QtGui import QIcon
+
+from .select_lines_algorithm import SelectLinesAlgorithm
+
+
+class SelectLinesProvider(QgsProcessingProvider):
+    """
+    Processing provider of the Select Lines algorithms.
+    """
+
+    def loadAlgorithms(self):
+        self.addAlgorithm(SelectLinesAlgorithm())
+
+    def id(self):
+        return 'selectlines'
+
+    def name(self):
+        return 'Select Lines'
+
+    def icon(self):
+        return QIcon(':/plugins/selectlines/icon.png')
@@ -0,0 +1,285 @@
+"""
+****************************************************************
+ Select Lines - segment grid engine
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+import itertools
+import math
+from array import array
+
+from qgis.core import QgsFeatureRequest, QgsGeometry, QgsLineString, QgsWkbTypes
+
+from .fid_set import HAS_NUMPY, FidSet, sorted_unique
+
+if HAS_NUMPY:
+    import numpy as np
+
+# Average number of segments per grid cell the cell size is chosen for
+SEGMENTS_PER_CELL = 4
+
+# Cells of the grid at most, each costs 8 bytes
+MAX_CELLS = 1 << 22
+
+# Segments whose box covers more cells are kept aside and tested against every drawn segment
+MAX_SEGMENT_CELLS = 16
+
+
+def line_parts(geometry):
+    """
+    Get the vertices of each part of a line geometry, curves segmentized.
+
+    Parameters:
+    - geometry (QgsGeometry): The line or multi-line geometry.
+
+    Returns:
+    - parts (list): Tuples of the x and the y coordinates (list) of each part with at least 2 vertices.
+    """
+    if QgsWkbTypes.isCurvedType(geometry.wkbType()):
+        geometry = QgsGeometry(geometry.constGet().segmentize())
+    parts = []
+    for part in geometry.constParts():
+        if isinstance(part, QgsLineString) and part.numPoints() >= 2:
+            parts.append((part.xVector(), part.yVector()))
+    return parts
+
+
+def point_segment_distance2(x, y, ax, ay, ex, ey):
+    """
+    Get the squared distance from points to segments, broadcast over NumPy arrays.
+
+    Parameters:
+    - x, y: The coordinates of the points.
+    - ax, ay: The coordinates of the segment starts.
+    - ex, ey: The vectors from the segment starts to their ends.
+
+    Returns:
+    - numpy.ndarray: The squared distances.
+    """
+    length2 = ex * ex + ey * ey
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t = np.where(length2 > 0, ((x - ax) * ex + (y - ay) * ey) / length2, 0.0)
+    t = np.clip(t, 0.0, 1.0)
+    return (ax + t * ex - x) ** 2 + (ay + t * ey - y) ** 2
+
+
+def segments_within(px, py, qx, qy, ax, ay, bx, by, tolerance=0.0):
+    """
+    Test one segment against arrays of segments, for crossing or for a distance within a tolerance.
+
+    Parameters:
+    - px, py, qx, qy (float): The ends of the segment.
+    - ax, ay, bx, by (numpy.ndarray): The ends of the segments to test.
+    - tolerance (float): The distance within which the segments count as crossing, 0 for a crossing.
+
+    Returns:
+    - hits (numpy.ndarray): True for the segments crossing the segment, or close enough to it.
+    """
+    dx, dy = qx - px, qy - py
+    ex, ey = bx - ax, by - ay
+    # Each segment has the ends of the other on both sides of it, or on it
+    side_a = dx * (ay - py) - dy * (ax - px)
+    side_b = dx * (by - py) - dy * (bx - px)
+    side_p = ex * (py - ay) - ey * (px - ax)
+    side_q = ex * (qy - ay) - ey * (qx - ax)
+    hits = (side_a * side_b <= 0) & (side_p * side_q <= 0)
+    # Collinear segments pass the side tests, they also need overlapping boxes
+    hits &= ((np.minimum(ax, bx) <= max(px, qx)) & (np.maximum(ax, bx) >= min(px, qx)) &
+             (np.minimum(ay, by) <= max(py, qy)) & (np.maximum(ay, by) >= min(py, qy)))
+    if tolerance > 0:
+        # Segments that do not cross are closest at one of the four ends
+        distance2 = np.minimum(
+            np.minimum(point_segment_distance2(ax, ay, px, py, dx, dy), point_segment_distance2(bx, by, px, py, dx, dy)),
+            np.minimum(point_segment_distance2(px, py, ax, ay, ex, ey), point_segment_distance2(qx, qy, ax, ay, ex, ey)))
+        hits |= distance2 <= tolerance * tolerance
+    return hits
+
+
+class SegmentHashEngine:
+    """
+    The segments of the features of a line layer, hashed into a uniform grid of cells.
+
+    Each segment between two consecutive vertices is filed under the grid cells its box covers and
+    maps back to the ID of its feature. A drawn segment only looks at the segments of the cells it
+    passes through, and all of them are tested against it at once with NumPy. A long highway is
+    therefore accepted or rejected from its few segments near the drawn line, where an index of
+    the feature boxes hands the whole feature to GEOS for almost every drawn line. The few segments
+    covering more than MAX_SEGMENT_CELLS cells are tested against every drawn segment.
+
+    The cells are stored as one array of segment numbers sorted by cell, with the offset of each
+    cell in it, so the grid takes 8 bytes per cell and per filed segment.
+    """
+
+    def __init__(self, xs, ys, segment_starts, segment_fids, version):
+        """
+        Initialize the engine and hash the segments.
+
+        Parameters:
+        - xs (numpy.ndarray): The x coordinates of the vertices of all the parts, float64.
+        - ys (numpy.ndarray): The y coordinates of the vertices, float64.
+        - segment_starts (numpy.ndarray): The index of the first vertex of each segment, int64.
+        - segment_fids (numpy.ndarray): The feature ID of each segment, int64.
+        - version (int): The layer version counter the geometries were read at.
+
+        Returns:
+        None
+        """
+        self.xs = xs
+        self.ys = ys
+        self.starts = segment_starts
+        self.fids = segment_fids
+        self.version = version
+
+        x0, y0 = xs[segment_starts], ys[segment_starts]
+        x1, y1 = xs[segment_starts + 1], ys[segment_starts + 1]
+        minx, maxx = np.minimum(x0, x1), np.maximum(x0, x1)
+        miny, maxy = np.minimum(y0, y1), np.maximum(y0, y1)
+
+        # Square cells, about SEGMENTS_PER_CELL segments each on average
+        self.origin_x = float(minx.min()) if len(minx) else 0.0
+        self.origin_y = float(miny.min()) if len(miny) else 0.0
+        width = float(maxx.max()) - self.origin_x if len(maxx) else 0.0
+        height = float(maxy.max()) - self.origin_y if len(maxy) else 0.0
+        target = min(MAX_CELLS, max(1, len(segment_starts) // SEGMENTS_PER_CELL))
+        self.cell_size = max(math.sqrt(width * height / target), max(width, height) / target) or 1.0
+        self.columns = int(width // self.cell_size) + 1
+        self.rows = int(height // self.cell_size) + 1
+
+        columns0, rows0, columns1, rows1 = self.cell_ranges(minx, miny, maxx, maxy)
+        spans = (columns1 - columns0 + 1) * (rows1 - rows0 + 1)
+        self.long_segments = np.flatnonzero(spans > MAX_SEGMENT_CELLS)
+        short = np.flatnonzero(spans <= MAX_SEGMENT_CELLS)
+        cells, owners = self.expand_cells(columns0[short], rows0[short], columns1[short], rows1[short])
+        order = np.argsort(cells, kind='stable')
+        self.cell_segments = short[owners[order]]
+        self.cell_offsets = np.zeros(self.columns * self.rows + 1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=self.columns * self.rows), out=self.cell_offsets[1:])
+
+    @classmethod
+    def from_source(cls, source, version, feedback=None):
+        """
+        Load the segments of a layer or feature source snapshot.
+
+        Parameters:
+        - source (QgsAbstractFeatureSource): The layer or feature source snapshot, of lines.
+        - version (int): The layer version counter when the snapshot was taken.
+        - feedback (QgsFeedback): Optional feedback for cancellation.
+
+        Returns:
+        - SegmentHashEngine: The engine, or None if the feedback was canceled.
+        """
+        xs = array('d')
+        ys = array('d')
+        starts = array('q')
+        fids = array('q')
+        request = QgsFeatureRequest().setNoAttributes()
+        if feedback is not None:
+            request.setFeedback(feedback)
+        for feature in source.getFeatures(request):
+            feature_geom = feature.geometry()
+            if feature_geom.isNull():
+                continue
+            fid = feature.id()
+            for part_xs, part_ys in line_parts(feature_geom):
+                first = len(xs)
+                xs.extend(part_xs)
+                ys.extend(part_ys)
+                starts.extend(range(first, len(xs) - 1))
+                fids.extend(itertools.repeat(fid, len(part_xs) - 1))
+        if feedback is not None and feedback.isCanceled():
+            return None
+        return cls(np.frombuffer(xs, dtype=np.float64), np.frombuffer(ys, dtype=np.float64),
+                   np.frombuffer(starts, dtype=np.int64), np.frombuffer(fids, dtype=np.int64), version)
+
+    def cell_ranges(self, minx, miny, maxx, maxy):
+        """
+        Get the columns and rows of the cells covered by boxes, clamped to the grid.
+
+        Parameters:
+        - minx, miny, maxx, maxy (numpy.ndarray): The boxes.
+
+        Returns:
+        - (numpy.ndarray, numpy.ndarray, numpy.ndarray, numpy.ndarray): The first column, first row,
+          last column and last row of each box, int64.
+        """
+        def clamp(values, origin, count):
+            return np.clip(np.floor((values - origin) / self.cell_size), 0, count - 1).astype(np.int64)
+        return (clamp(minx, self.origin_x, self.columns), clamp(miny, self.origin_y, self.rows),
+                clamp(maxx, self.origin_x, self.columns), clamp(maxy, self.origin_y, self.rows))
+
+    def expand_cells(self, columns0, rows0, columns1, rows1):
+        """
+        List the cells covered by ranges of columns and rows.
+
+        Parameters:
+        - columns0, rows0, columns1, rows1 (numpy.ndarray): The cell ranges, see `cell_ranges`.
+
+        Returns:
+        - cells (numpy.ndarray): The number of each covered cell.
+        - owners (numpy.ndarray): The index of the range each cell belongs to.
+        """
+        heights = rows1 - rows0 + 1
+        counts = (columns1 - columns0 + 1) * heights
+        owners = np.repeat(np.arange(len(counts)), counts)
+        within = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        columns = columns0[owners] + within // heights[owners]
+        rows = rows0[owners] + within % heights[owners]
+        return columns * self.rows + rows, owners
+
+    def segment_hits(self, px, py, qx, qy, tolerance=0.0):
+        """
+        Get the feature IDs of the segments crossing a drawn segment.
+
+        The drawn segment is cut in pieces about one cell long, so a long diagonal only looks at
+        the cells along it and not at all the cells of its box.
+
+        Parameters:
+        - px, py, qx, qy (float): The ends of the drawn segment, in the layer CRS.
+        - tolerance (float): The distance within which a segment counts as crossing, in layer units.
+
+        Returns:
+        - fids (numpy.ndarray): The feature IDs, with duplicates.
+        """
+        pieces = max(1, math.ceil(math.hypot(qx - px, qy - py) / self.cell_size))
+        t = np.linspace(0.0, 1.0, pieces + 1)
+        xs = px + (qx - px) * t
+        ys = py + (qy - py) * t
+        cells, _ = self.expand_cells(*self.cell_ranges(np.minimum(xs[:-1], xs[1:]) - tolerance,
+                                                       np.minimum(ys[:-1], ys[1:]) - tolerance,
+                                                       np.maximum(xs[:-1], xs[1:]) + tolerance,
+                                                       np.maximum(ys[:-1], ys[1:]) + tolerance))
+        cells = sorted_unique(cells)
+        firsts = self.cell_offsets[cells]
+        counts = self.cell_offsets[cells + 1] - firsts
+        positions = np.arange(counts.sum()) + np.repeat(firsts - (np.cumsum(counts) - counts), counts)
+        candidates = sorted_unique(np.concatenate((self.cell_segments[positions], self.long_segments)))
+        if not len(candidates):
+            return candidates
+
+        starts = self.starts[candidates]
+        hits = segments_within(px, py, qx, qy, self.xs[starts], self.ys[starts], self.xs[starts + 1],
+                               self.ys[starts + 1], tolerance)
+        return self.fids[candidates[hits]]
+
+    def get_lines_ids(self, drawn_geometries, tolerance=0.0):
+        """
+        Get, for each drawn geometry, the IDs of the features that cross it.
+
+        Parameters:
+        - drawn_geometries (list): The drawn lines (QgsGeometry), in the layer CRS.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        - intersecting_ids (list): A FidSet of crossing IDs for each drawn geometry, in the same order.
+        """
+        intersecting_ids = []
+        for drawn_geometry in drawn_geometries:
+            hits = []
+            for part_xs, part_ys in line_parts(drawn_geometry):
+                for i in range(len(part_xs) - 1):
+                    hits.append(self.segment_hits(part_xs[i], part_ys[i], part_xs[i + 1], part_ys[i + 1], tolerance))
+            intersecting_ids.append(FidSet(np.concatenate(hits)) if hits else FidSet())
+        return intersecting_ids
@@ -0,0 +1,227 @@
+"""
+****************************************************************
+ Select Lines - Processing algorithm
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+from qgis.core import (NULL, QgsFeatureRequest, QgsFeatureSink, QgsProcessing,
+                       QgsProcessingAlgorithm, QgsProcessingException, QgsProcessingOutputNumber,
+                       QgsProcessingParameterBoolean, QgsProcessingParameterDistance,
+                       QgsProcessingParameterFeatureSink, QgsProcessingParameterFeatureSource,
+                       QgsProcessingParameterField, QgsProcessingParameterFileDestination,
+                       QgsProcessingParameterVectorLayer, QgsVectorLayer)
+
+from .fid_set import FidSet
+from .select_lines_task import LayerSelectionJob
+from .selection_engine import commit_selection
+
+OPERATIONS = ('add', 'filter', 'remove')
+
+
+def is_null(value):
+    """
+    Check if an attribute value is missing.
+
+    Parameters:
+    - value: The attribute value.
+
+    Returns:
+    - bool: True for None and NULL values.
+    """
+    return value is None or value == NULL
+
+
+class SelectLinesAlgorithm(QgsProcessingAlgorithm):
+    """
+    Select the features of a line layer with the lines of a cutting lines layer, as drawn in the panel.
+
+    Each cutting line adds, filters or removes the features it intersects, in the order of the order
+    field. Without an operation field the first line adds and the next lines filter, as in the
+    automatic mode of the panel. The layer is snapshotted on the main thread and searched with the
+    same index and engine as the panel, so the algorithm can run in the background.
+    """
+
+    INPUT = 'INPUT'
+    CUTTING_LINES = 'CUTTING_LINES'
+    ORDER_FIELD = 'ORDER_FIELD'
+    OPERATION_FIELD = 'OPERATION_FIELD'
+    TOLERANCE = 'TOLERANCE'
+    USE_SELECTION = 'USE_SELECTION'
+    MODIFY_SELECTION = 'MODIFY_SELECTION'
+    OUTPUT = 'OUTPUT'
+    FID_LIST = 'FID_LIST'
+    SELECTED_COUNT = 'SELECTED_COUNT'
+
+    def createInstance(self):
+        return SelectLinesAlgorithm()
+
+    def name(self):
+        return 'selectlinescrossingdrawnlines'
+
+    def displayName(self):
+        return 'Select lines crossing drawn lines'
+
+    def shortHelpString(self):
+        return ("Selects the features of a line layer that cross a sequence of cutting lines.\n\n"
+                "The cutting lines are applied in the order of the order field, or in feature order. "
+                "The operation field holds 'add', 'filter' or 'remove' for each line. Without it the "
+                "first line adds to the selection and the next lines filter it, as in the automatic mode "
+                "of the panel.\n\n"
+                "With a tolerance, the features within that distance of a cutting line count as crossed.\n\n"
+                "The result can be applied as the layer selection, written to a new layer and written "
+                "to a text file with one feature ID per line.")
+
+    def initAlgorithm(self, config=None):
+        self.addParameter(QgsProcessingParameterVectorLayer(
+            self.INPUT, 'Line layer', [QgsProcessing.TypeVectorLine]))
+        self.addParameter(QgsProcessingParameterFeatureSource(
+            self.CUTTING_LINES, 'Cutting lines', [QgsProcessing.TypeVectorLine]))
+        self.addParameter(QgsProcessingParameterField(
+            self.ORDER_FIELD, 'Order field', parentLayerParameterName=self.CUTTING_LINES,
+            type=QgsProcessingParameterField.Numeric, optional=True))
+        self.addParameter(QgsProcessingParameterField(
+            self.OPERATION_FIELD, 'Operation field (add, filter or remove)',
+            parentLayerParameterName=self.CUTTING_LINES, type=QgsProcessingParameterField.String, optional=True))
+        self.addParameter(QgsProcessingParameterDistance(
+            self.TOLERANCE, 'Tolerance', defaultValue=0.0, parentParameterName=self.INPUT, minValue=0.0))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.USE_SELECTION, 'Start from the current selection of the line layer', defaultValue=False))
+        self.addParameter(QgsProcessingParameterBoolean(
+            self.MODIFY_SELECTION, 'Select the features in the line layer', defaultValue=True))
+        self.addParameter(QgsProcessingParameterFeatureSink(
+            self.OUTPUT, 'Selected lines', QgsProcessing.TypeVectorLine, optional=True, createByDefault=False))
+        self.addParameter(QgsProcessingParameterFileDestination(
+            self.FID_LIST, 'Selected feature IDs', 'Text files (*.txt)', optional=True, createByDefault=False))
+        self.addOutput(QgsProcessingOutputNumber(self.SELECTED_COUNT, 'Number of selected features'))
+
+    def prepareAlgorithm(self, parameters, context, feedback):
+        """
+        Snapshot the line layer, on the main thread.
+
+        Parameters:
+        - parameters (dict): The algorithm parameters.
+        - context (QgsProcessingContext): The processing context.
+        - feedback (QgsProcessingFeedback): The processing feedback.
+
+        Returns:
+        - bool: True if the algorithm can run.
+        """
+        layer = self.parameterAsVectorLayer(parameters, self.INPUT, context)
+        if not isinstance(layer, QgsVectorLayer):
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.INPUT))
+        self.layer = layer
+        # Read here, processAlgorithm runs on a worker thread where the layer must not be touched
+        self.fields = layer.fields()
+        self.wkb_type = layer.wkbType()
+        self.crs = layer.crs()
+        self.job = LayerSelectionJob(layer, self.parameterAsDouble(parameters, self.TOLERANCE, context))
+        self.initial_ids = FidSet(layer.selectedFeatureIds()) if self.parameterAsBoolean(parameters, self.USE_SELECTION, context) else FidSet()
+        self.modify_selection = self.parameterAsBoolean(parameters, self.MODIFY_SELECTION, context)
+        self.selected_ids = None
+        return True
+
+    def get_steps(self, parameters, context, feedback):
+        """
+        Read the cutting lines and their operations, in the line layer CRS and in order.
+
+        Parameters:
+        - parameters (dict): The algorithm parameters.
+        - context (QgsProcessingContext): The processing context.
+        - feedback (QgsProcessingFeedback): The processing feedback.
+
+        Returns:
+        - steps (list): Tuples of cutting line (QgsGeometry) and operation, in order.
+        """
+        cutting_lines = self.parameterAsSource(parameters, self.CUTTING_LINES, context)
+        if cutting_lines is None:
+            raise QgsProcessingException(self.invalidSourceError(parameters, self.CUTTING_LINES))
+        order_field = self.parameterAsString(parameters, self.ORDER_FIELD, context)
+        operation_field = self.parameterAsString(parameters, self.OPERATION_FIELD, context)
+
+        attributes = [name for name in (order_field, operation_field) if name]
+        request = QgsFeatureRequest().setSubsetOfAttributes(attributes, cutting_lines.fields())
+        request.setDestinationCrs(self.crs, context.transformContext())
+
+        lines = []
+        for feature in cutting_lines.getFeatures(request):
+            if feedback.isCanceled():
+                return []
+            cutting_geometry = feature.geometry()
+            if cutting_geometry.isNull():
+                continue
+            order = feature[order_field] if order_field else None
+            operation = feature[operation_field] if operation_field else None
+            lines.append((order, feature.id(), cutting_geometry, operation))
+
+        if order_field:
+            # Lines without an order go last, ties keep the feature order
+            lines.sort(key=lambda line: (is_null(line[0]), 0 if is_null(line[0]) else line[0], line[1]))
+        else:
+            lines.sort(key=lambda line: line[1])
+
+        steps = []
+        for i, (_, fid, cutting_geometry, operation) in enumerate(lines):
+            if operation_field:
+                operation = '' if is_null(operation) else str(operation).strip().lower()
+                if operation not in OPERATIONS:
+                    raise QgsProcessingException(
+                        f"Cutting line {fid} has the operation '{operation}', expected add, filter or remove")
+            else:
+                operation = 'add' if i == 0 else 'filter'
+            steps.append((cutting_geometry, operation))
+        return steps
+
+    def processAlgorithm(self, parameters, context, feedback):
+        steps = self.get_steps(parameters, context, feedback)
+        if feedback.isCanceled():
+            return {}
+        feedback.pushInfo(f"{len(steps)} cutting lines, {self.job.engine} engine")
+
+        result = self.job.run(steps, self.initial_ids, feedback)
+        if result is None:
+            return {}
+        for i, step in enumerate(result.step_stats, start=1):
+            feedback.pushInfo(f"Line {i}: {step['operation']}, {step['intersecting']} intersecting features, {step['selected']} selected")
+        feedback.pushInfo(f"{result.stats['fetched']} features fetched, {result.stats['tested']} tested")
+        if 'cache_hits' in result.stats:
+            feedback.pushInfo(f"Line cache: {result.stats['cache_hits']} hits, {result.stats['cache_misses']} misses")
+        self.selected_ids = result.selected_ids
+
+        outputs = {self.SELECTED_COUNT: len(self.selected_ids)}
+        (sink, dest_id) = self.parameterAsSink(parameters, self.OUTPUT, context, self.fields,
+                                               self.wkb_type, self.crs)
+        if sink is not None:
+            # Copy from the snapshot, the layer itself belongs to the main thread
+            request = QgsFeatureRequest().setFilterFids(self.selected_ids.tolist())
+            for feature in self.job.source.getFeatures(request):
+                if feedback.isCanceled():
+                    break
+                sink.addFeature(feature, QgsFeatureSink.FastInsert)
+            outputs[self.OUTPUT] = dest_id
+
+        fid_list = self.parameterAsFileOutput(parameters, self.FID_LIST, context)
+        if fid_list:
+            with open(fid_list, 'w') as f:
+                f.writelines(f"{fid}\n" for fid in self.selected_ids.tolist())
+            outputs[self.FID_LIST] = fid_list
+        return outputs
+
+    def postProcessAlgorithm(self, context, feedback):
+        """
+        Hand the built index over to the layer and apply the selection, on the main thread.
+
+        Parameters:
+        - context (QgsProcessingContext): The processing context.
+        - feedback (QgsProcessingFeedback): The processing feedback.
+
+        Returns:
+        - dict: No additional outputs.
+        """
+        if self.selected_ids is not None:
+            self.job.finish()
+            if self.modify_selection:
+                commit_selection(self.layer, self.selected_ids)
+        return {}
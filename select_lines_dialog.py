@@ -18,6 +18,15 @@ from qgis.utils import *
 from qgis.core import *
 from qgis.PyQt.QtCore import pyqtSignal
 
+from .hit_preview import HitPreview
+from .select_lines_task import ENGINE_CLASSES, SelectLinesTask
+from .selection_engine import (TOLERANCE_SETTING, commit_selection, get_lines_ids, layer_candidate_lookup,
+                               pixels_to_layer_units)
+from .fid_set import FidSet
+from .selection_history import SelectionHistory
+from .shapely_engine import ENGINE_SETTING, HAS_SHAPELY, cached_shapely_engine, engine_for_layer, store_shapely_engine
+from .spatial_index import layer_spatial_index
+
 
 sys.modules["qgsfieldcombobox"] = qgis.gui
 sys.modules["qgsmaplayercombobox"] = qgis.gui
@@ -30,6 +39,15 @@ except ImportError:
 FORM_CLASS, _ = uic.loadUiType(os.path.join(
     os.path.dirname(__file__), 'selectLines.ui'))
 
+# Settings key of the drawing mode
+DRAW_MODE_SETTING = 'select_lines/draw_mode'
+
+# Tolerance of the simplification of polylines and freehand strokes, in screen pixels
+SIMPLIFY_TOLERANCE_PX = 2
+
+# Distance the cursor moves before a freehand stroke gets a new vertex, in screen pixels
+FREEHAND_STEP_PX = 3
+
 
 class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
 
@@ -56,6 +74,21 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
         
         # Initialize the tool attribute to None
         self.tool = None
+
+        # The background tasks computing the selection, one per layer, and those already completed
+        self.select_tasks = []
+        self.completed_tasks = []
+        # Layers that needed no task, applied together with the task results
+        self.ready_results = []
+
+        # State of the evaluation of the lines as they are drawn
+        self.reset_live_selection()
+
+        # Selection after each drawn line of the active layer, to step back and forth without recomputing
+        self.history = None
+        self.history_layer_id = None
+        # Lines removed by undo, the last one is drawn again by redo
+        self.redo_lines = []
         
         # Set the automatic mode to True
         self.automatic_mode = True
@@ -73,7 +106,10 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
         self.pushButton_draw_lines.clicked.connect(self.draw_lines)
         self.pushButton_reset_lines.clicked.connect(self.reset)
         self.pushButton_select_features.clicked.connect(self.select_features)        
+        self.pushButton_cancel_select.clicked.connect(self.cancel_select_task)
         self.pushButton_init.clicked.connect(self.init_manual)
+        self.pushButton_undo.clicked.connect(self.undo_line)
+        self.pushButton_redo.clicked.connect(self.redo_line)
         self.radioButton_add_lines.toggled.connect(self.add_lines)
         self.radioButton_remove_lines.toggled.connect(self.subtract_lines)
         self.radioButton_filter_lines.toggled.connect(self.filter_lines)  
@@ -81,6 +117,40 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
         # Disable the reset lines and select  button initially
         self.pushButton_reset_lines.setEnabled(False)
         self.pushButton_select_features.setEnabled(False)
+        self.pushButton_undo.setEnabled(False)
+        self.pushButton_redo.setEnabled(False)
+
+        # Engine used to compute the intersections, stored in the settings
+        self.comboBox_engine.addItem("Engine: automatic", 'auto')
+        self.comboBox_engine.addItem("Engine: GEOS", 'geos')
+        self.comboBox_engine.addItem("Engine: Shapely STRtree", 'shapely')
+        self.comboBox_engine.addItem("Engine: segment grid", 'segments')
+        self.comboBox_engine.setCurrentIndex(max(0, self.comboBox_engine.findData(QgsSettings().value(ENGINE_SETTING, 'auto'))))
+        if not HAS_SHAPELY:
+          self.comboBox_engine.setToolTip("Shapely 2 is not installed, the Shapely STRtree engine falls back to GEOS")
+        self.comboBox_engine.currentIndexChanged.connect(self.on_engine_changed)
+
+        # Shape of the drawn lines, stored in the settings
+        self.comboBox_draw_mode.addItem("Draw: straight lines", 'line')
+        self.comboBox_draw_mode.addItem("Draw: polylines", 'polyline')
+        self.comboBox_draw_mode.addItem("Draw: freehand", 'freehand')
+        self.comboBox_draw_mode.setCurrentIndex(max(0, self.comboBox_draw_mode.findData(QgsSettings().value(DRAW_MODE_SETTING, 'line'))))
+        self.comboBox_draw_mode.currentIndexChanged.connect(self.on_draw_mode_changed)
+
+        # Distance in screen pixels within which a feature counts as crossed, stored in the settings
+        self.spinBox_tolerance.setValue(QgsSettings().value(TOLERANCE_SETTING, 0, type=int))
+        self.spinBox_tolerance.valueChanged.connect(self.on_tolerance_changed)
+
+        # Layers the lines are applied to in multi-layer mode
+        self.listWidget_layers.setVisible(False)
+        self.checkBox_multi_layer.toggled.connect(self.on_multi_layer_toggled)
+
+        # Preview of the features crossed by the line being drawn
+        self.checkBox_preview.toggled.connect(self.set_tool_preview)
+
+        # The progress of the selection is only shown while it runs
+        self.progressBar_select.setVisible(False)
+        self.pushButton_cancel_select.setVisible(False)
 
     def closeEvent(self, event):
         """
@@ -93,8 +163,10 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
         Returns:
         None
         """
+        self.cancel_select_task()
         if self.tool is not None:
           self.tool.removeRubberBands()
+          self.tool.set_preview(None)
         # Find the layer by its name
         layer_check = QgsProject.instance().mapLayersByName(self.annotaiton_layer_name)
         # Check if the layer exists in the Table of Contents
@@ -144,23 +216,16 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
       # Remove any existing rubber bands
       if (self.tool is not None):
           self.tool.removeRubberBands()
+          self.tool.set_preview(None)
       
-      # Find the layer by its name
-      layer_check = QgsProject.instance().mapLayersByName(self.annotaiton_layer_name)
-      
-      # Check if the layer exists in the Table of Contents
-      if len(layer_check) == 0:
-          # Create a new annotation layer and add it to the project
-          self.annolayer = QgsAnnotationLayer(self.annotaiton_layer_name, QgsAnnotationLayer.LayerOptions(QgsProject.instance().transformContext()))
-          QgsProject.instance().addMapLayer(self.annolayer)
-          self.annolayer.setFlags(QgsMapLayer.Private)
-          self.iface.setActiveLayer(self.active_layer)
-      else:
-          # Use the existing annotation layer
-          self.annolayer = layer_check[0]
+      # Get the annotation layer of the line numbers
+      self.annolayer = self.get_annotation_layer()
       
       # Create a new LineTool instance with the necessary parameters - most imporatnly it is in Automatic mode
       self.tool = LineTool(self.iface.mapCanvas(), self.pushButton_reset_lines, self.pushButton_select_features, self.iface.activeLayer().crs(), self.annolayer, True)
+      self.tool.draw_mode = self.comboBox_draw_mode.currentData()
+      self.tool.lineDrawn.connect(self.on_line_drawn)
+      self.set_tool_preview()
       
       # Set the map tool to LineTool
       self.iface.mapCanvas().setMapTool(self.tool)
@@ -183,6 +248,11 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
       Returns:
         None
       """
+      # A selection still running would otherwise be applied after the reset
+      self.cancel_select_task()
+      self.reset_live_selection()
+      self.reset_history()
+      self.redo_lines = []
       if self.tool is not None:
           # Remove rubber bands and reset cursor
           self.tool.removeRubberBands()
@@ -193,25 +263,41 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
           self.pushButton_select_features.setEnabled(False)
           self.pushButton_draw_lines.setEnabled(True)
           self.init_manual_mode = False
-          # Remove and recreate annotation layer
-          # Find the layer by its name
-          layer_check = QgsProject.instance().mapLayersByName(self.annotaiton_layer_name)
-          # rember the active layer before removing the annotationlayer
-          self.active_layer = self.iface.activeLayer()
-          # Check if the layer exists in the Table of Contents
-          if len(layer_check) > 0:
-             QgsProject.instance().removeMapLayer(layer_check[0].id())
-
-          self.annolayer = QgsAnnotationLayer(self.annotaiton_layer_name, QgsAnnotationLayer.LayerOptions(QgsProject.instance().transformContext()))
-          QgsProject.instance().addMapLayer(self.annolayer)
-          self.annolayer.setFlags(QgsMapLayer.Private)
-          
-          # Set active layer
-          self.iface.setActiveLayer(self.active_layer)
+          # Clear the line numbers, the annotation layer stays in the project
+          for annolayer in QgsProject.instance().mapLayersByName(self.annotaiton_layer_name):
+            annolayer.clear()
+      # Once the lines are removed, so undo is disabled
+      self.update_history_buttons()
+
+    def get_annotation_layer(self):
+      """
+      Get the annotation layer of the line numbers, adding it to the project only if it is missing.
+
+      Returns:
+      - annolayer (QgsAnnotationLayer): The annotation layer.
+      """
+      # Find the layer by its name
+      layer_check = QgsProject.instance().mapLayersByName(self.annotaiton_layer_name)
+      if len(layer_check) > 0:
+        # Use the existing annotation layer
+        return layer_check[0]
+
+      # Create a new annotation layer and add it to the project, keeping the active layer
+      active_layer = self.iface.activeLayer()
+      annolayer = QgsAnnotationLayer(self.annotaiton_layer_name, QgsAnnotationLayer.LayerOptions(QgsProject.instance().transformContext()))
+      annolayer.setFlags(QgsMapLayer.Private)
+      QgsProject.instance().addMapLayer(annolayer)
+      self.iface.setActiveLayer(active_layer)
+      return annolayer
 
     def select_features(self):
       """
-      Selects features in the active layer based on drawn lines.
+      Selects features in the active layer, or in several layers, based on drawn lines.
+
+      The intersections are computed by one SelectLinesTask per layer in the background, on a
+      snapshot of each layer, so the layers are evaluated in parallel by the task manager. The
+      selections are applied together once all the tasks completed. Tasks still running from a
+      previous click are canceled and replaced.
       Returns:
         None
       Raises:
@@ -220,52 +306,507 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
       # Set cursor to regular arrow
       self.iface.mapCanvas().setCursor(QtCore.Qt.ArrowCursor)
 
-      # Check if active layer is valid and if tool is initialized
-      layer = self.iface.activeLayer()
-      if not layer or not layer.isValid():
+      # Check if the layers are valid and if tool is initialized
+      layers = self.get_target_layers()
+      if not layers:
         self.iface.messageBar().pushMessage("Error", "Invalid layer provided.", level=Qgis.Critical)
         return
       if self.tool is None:
         self.iface.messageBar().pushMessage("Error", "No Drawn lines", level=Qgis.Critical)
         return
-      
-      # get a set of the currently selected features
-      set_of_ids_to_select = set(feature.id() for feature in layer.selectedFeatures())
 
+      # Cancel jobs that are still running, their result is stale
+      self.cancel_select_task()
+
+      # The next drawn line starts a new sequence
+      self.tool.start_new_sequence()
+
+      tasks = []
+      results = []
+      for layer in layers:
+        # get a set of the currently selected features
+        set_of_ids_to_select = FidSet(layer.selectedFeatureIds())
+
+        # Collect the drawn lines in the layer's CRS
+        drawn_lines = self.get_drawn_lines(layer)
+
+        # The tolerance follows the current zoom
+        tolerance = self.layer_tolerance(layer)
+
+        # Continue from the lines already evaluated while they were drawn
+        done = 0
+        if self.live_layer_id == layer.id() and self.live_initial_ids == set_of_ids_to_select and \
+           self.live_tolerance == tolerance and self.same_lines(self.live_lines[:self.live_done], drawn_lines[:self.live_done]):
+          done = self.live_done
+          drawn_lines = drawn_lines[done:]
+          set_of_ids_to_select = self.live_ids
+        else:
+          # The lines are evaluated from the current selection
+          self.reset_history(layer)
+
+        if not drawn_lines:
+          # Everything was evaluated already
+          results.append((layer, set_of_ids_to_select, None))
+          continue
+
+        # Record the selection after each line, continuing the history of the lines already evaluated
+        history_start = None
+        if self.history is not None and self.history_layer_id == layer.id() and len(self.history) > done:
+          self.history.truncate(done + 1)
+          history_start = done + 1
+        tasks.append(SelectLinesTask(layer, drawn_lines, set_of_ids_to_select, history_start, tolerance))
+      self.reset_live_selection()
+
+      if not tasks:
+        self.apply_selections(results)
+        return
+
+      # Get the IDs of the lines that intersect with the drawn lines in the background
+      self.select_tasks = tasks
+      self.completed_tasks = []
+      self.ready_results = results
+      self.progressBar_select.setValue(0)
+      self.progressBar_select.setVisible(True)
+      self.pushButton_cancel_select.setVisible(True)
+      for task in tasks:
+        task.progressChanged.connect(lambda progress, task=task: self.on_select_task_progress(task, progress))
+        task.taskCompleted.connect(lambda task=task: self.on_select_task_completed(task))
+        task.taskTerminated.connect(lambda task=task: self.on_select_task_terminated(task))
+        QgsApplication.taskManager().addTask(task)
+
+    def get_target_layers(self):
+      """
+      Get the layers the drawn lines are applied to.
+
+      In multi-layer mode these are the layers checked in the panel, or the layers selected in the
+      Layers panel when none is checked. Otherwise it is the active layer.
+
+      Returns:
+      - layers (list): The valid vector layers (QgsVectorLayer).
+      """
+      if not self.checkBox_multi_layer.isChecked():
+        layers = [self.iface.activeLayer()]
+      else:
+        self.refresh_layer_list()
+        project = QgsProject.instance()
+        layers = [project.mapLayer(self.listWidget_layers.item(i).data(QtCore.Qt.UserRole))
+                  for i in range(self.listWidget_layers.count())
+                  if self.listWidget_layers.item(i).checkState() == QtCore.Qt.Checked]
+        if not layers:
+          layers = self.iface.layerTreeView().selectedLayers()
+      return [layer for layer in layers if isinstance(layer, QgsVectorLayer) and layer.isValid()]
+
+    def refresh_layer_list(self):
+      """
+      List the line layers of the project in the panel, keeping the layers already checked.
+
+      Returns:
+        None
+      """
+      checked_ids = {self.listWidget_layers.item(i).data(QtCore.Qt.UserRole)
+                     for i in range(self.listWidget_layers.count())
+                     if self.listWidget_layers.item(i).checkState() == QtCore.Qt.Checked}
+      self.listWidget_layers.clear()
+      for layer in QgsProject.instance().mapLayers().values():
+        if not isinstance(layer, QgsVectorLayer) or layer.geometryType() != QgsWkbTypes.LineGeometry:
+          continue
+        item = QListWidgetItem(layer.name())
+        item.setData(QtCore.Qt.UserRole, layer.id())
+        item.setFlags(item.flags() | QtCore.Qt.ItemIsUserCheckable)
+        item.setCheckState(QtCore.Qt.Checked if layer.id() in checked_ids else QtCore.Qt.Unchecked)
+        self.listWidget_layers.addItem(item)
+
+    def set_tool_preview(self):
+      """
+      Turn the live preview of the line tool on or off, following the checkbox.
+
+      Returns:
+        None
+      """
+      if self.tool is None:
+        return
+      layer = self.iface.activeLayer()
+      if self.checkBox_preview.isChecked() and isinstance(layer, QgsVectorLayer) and layer.isValid():
+        self.tool.set_preview(HitPreview(self.iface.mapCanvas(), layer, self.spinBox_tolerance.value()))
+      else:
+        self.tool.set_preview(None)
+
+    def on_multi_layer_toggled(self, checked):
+      """
+      Show the layer list when the multi-layer mode is turned on.
+
+      Parameters:
+      - checked (bool): True if the multi-layer mode is on.
+
+      Returns:
+        None
+      """
+      if checked:
+        self.refresh_layer_list()
+      self.listWidget_layers.setVisible(checked)
+
+    def get_drawn_lines(self, layer):
+      """
+      Get the drawn lines and their operations, in the layer's CRS.
+
+      Parameters:
+      - layer (QgsVectorLayer): The layer the lines are applied to.
+
+      Returns:
+      - drawn_lines (list): Tuples of the drawn geometry (QgsGeometry) and its operation, in drawing order.
+      """
       # prepare transform - this is needed to draw the lines in the layer coordinates system
       project_crs = QgsProject.instance().crs()
       layer_crs = layer.crs()
       transform = QgsCoordinateTransform(project_crs, layer_crs, QgsProject.instance().transformContext())
 
-      # Iterate over the drawn lines and get the IDs of the lines that intersect with them
-      for i, rubber_band_dict in enumerate(self.tool.rubberBand_list):
-        drawn_geometry = rubber_band_dict['geom'].asGeometry()
+      drawn_lines = []
+      for line in self.tool.lines:
+        drawn_geometry = self.tool.line_geometry(line)
         # Transform the geometry to the layer's CRS
         drawn_geometry.transform(transform)
-        if not drawn_geometry.isNull():
-          lines_intersect_ids = self.get_line_ids(layer, drawn_geometry)
-          if rubber_band_dict['operation'] == 'add':
-            set_of_ids_to_select = set_of_ids_to_select.union(lines_intersect_ids)
-          elif rubber_band_dict['operation'] == 'filter':
-            set_of_ids_to_select = set_of_ids_to_select.intersection(lines_intersect_ids)
-          else:
-            set_of_ids_to_select = set_of_ids_to_select.difference(lines_intersect_ids)
-
-        layer.selectByIds(list(set_of_ids_to_select))
-      
-      # Refresh the layer to update the selection
-      self.tool.index = self.tool.index_max
-      layer.triggerRepaint()
+        drawn_lines.append((drawn_geometry, line['operation']))
+      return drawn_lines
+
+    def same_lines(self, lines, other_lines):
+      """
+      Check if two lists of drawn lines have the same geometries and operations.
+
+      Parameters:
+      - lines (list): Tuples of drawn geometry (QgsGeometry) and operation.
+      - other_lines (list): Tuples of drawn geometry (QgsGeometry) and operation.
+
+      Returns:
+      - bool: True if both lists are the same.
+      """
+      if len(lines) != len(other_lines):
+        return False
+      return all(operation == other_operation and drawn_geometry.asWkb() == other_geometry.asWkb()
+                 for (drawn_geometry, operation), (other_geometry, other_operation) in zip(lines, other_lines))
+
+    def reset_live_selection(self):
+      """
+      Forget the lines evaluated while they were drawn and cancel their evaluation.
+
+      Returns:
+        None
+      """
+      live_task = getattr(self, 'live_task', None)
+      self.live_task = None
+      if live_task is not None:
+        live_task.cancel()
+      # Layer, selection and tolerance the evaluation started from
+      self.live_layer_id = None
+      self.live_initial_ids = None
+      self.live_tolerance = None
+      # Lines submitted for evaluation, the first live_done of them are applied to live_ids
+      self.live_lines = []
+      self.live_done = 0
+      self.live_ids = FidSet()
+      self.label_live_status.setText('')
+
+    def on_line_drawn(self, index):
+      """
+      Evaluate a line as soon as it is drawn, against the running selection set.
+
+      Parameters:
+      - index (int): The index of the drawn line.
+
+      Returns:
+        None
+      """
+      layer = self.iface.activeLayer()
+
+      # A new line replaces the lines undone before it, and the selections recorded after them
+      self.redo_lines = []
+      if index == 0:
+        self.reset_history(layer)
+      elif self.history is not None:
+        self.history.truncate(index + 1)
+      self.update_history_buttons()
+
+      if not self.checkBox_live_evaluation.isChecked():
+        return
+      if not isinstance(layer, QgsVectorLayer) or not layer.isValid():
+        return
+
+      drawn_lines = self.get_drawn_lines(layer)
+      tolerance = self.layer_tolerance(layer)
+      if self.live_layer_id != layer.id() or self.live_tolerance != tolerance or \
+         not self.same_lines(self.live_lines, drawn_lines[:len(self.live_lines)]):
+        # A line was redrawn, the layer changed or the map was zoomed, start over
+        self.reset_live_selection()
+        if index != 0 or self.history_layer_id != layer.id():
+          self.reset_history(layer)
+        self.live_layer_id = layer.id()
+        self.live_initial_ids = FidSet(layer.selectedFeatureIds())
+        self.live_tolerance = tolerance
+        self.live_ids = self.live_initial_ids
+      self.live_lines.extend(drawn_lines[len(self.live_lines):])
+      self.run_next_live_step()
+
+    def run_next_live_step(self):
+      """
+      Start the evaluation of the next line waiting for it, one line at a time.
+
+      Returns:
+        None
+      """
+      if self.live_task is not None or self.live_done >= len(self.live_lines):
+        return
+      layer = QgsProject.instance().mapLayer(self.live_layer_id)
+      if layer is None:
+        self.reset_live_selection()
+        return
+      history_start = None
+      if self.history is not None and self.history_layer_id == layer.id() and len(self.history) == self.live_done + 1:
+        history_start = self.live_done + 1
+      task = SelectLinesTask(layer, [self.live_lines[self.live_done]], self.live_ids, history_start, self.live_tolerance)
+      task.taskCompleted.connect(lambda task=task: self.on_live_step_completed(task))
+      task.taskTerminated.connect(lambda task=task: self.on_live_step_terminated(task))
+      self.live_task = task
+      self.label_live_status.setText(f"Line {self.live_done + 1}: evaluating...")
+      QgsApplication.taskManager().addTask(task)
+
+    def on_live_step_completed(self, task):
+      """
+      Record the running selection set after a line evaluated in the background.
+
+      Parameters:
+      - task (SelectLinesTask): The completed task.
+
+      Returns:
+        None
+      """
+      if task is not self.live_task:
+        return
+      self.live_task = None
+      self.live_ids = task.result_ids
+      self.live_done += 1
+      if task.history is not None and self.history is not None and self.history_layer_id == task.layer_id:
+        self.history.extend(task.history)
+      self.label_live_status.setText(f"Line {self.live_done}: {len(self.live_ids)} candidates remain")
+      self.run_next_live_step()
+
+    def on_live_step_terminated(self, task):
+      """
+      Forget the running selection set if the evaluation of a line failed.
+
+      Parameters:
+      - task (SelectLinesTask): The terminated task.
+
+      Returns:
+        None
+      """
+      if task is self.live_task:
+        self.reset_live_selection()
+
+    def reset_history(self, layer=None):
+      """
+      Start the history of the selection steps from the current selection of a layer.
+
+      Parameters:
+      - layer (QgsVectorLayer): The layer the lines are applied to, None to only forget the history.
+        There is no history in multi-layer mode.
+
+      Returns:
+        None
+      """
+      self.history = None
+      self.history_layer_id = None
+      if layer is None or self.checkBox_multi_layer.isChecked():
+        return
+      if not isinstance(layer, QgsVectorLayer) or not layer.isValid():
+        return
+      self.history = SelectionHistory()
+      self.history.append(FidSet(layer.selectedFeatureIds()))
+      self.history_layer_id = layer.id()
+
+    def update_history_buttons(self):
+      """
+      Enable the undo and redo buttons when there is a line to remove or to draw again.
+
+      Returns:
+        None
+      """
+      self.pushButton_undo.setEnabled(self.tool is not None and len(self.tool.lines) > 0)
+      self.pushButton_redo.setEnabled(self.tool is not None and len(self.redo_lines) > 0)
+
+    def undo_line(self):
+      """
+      Remove the last drawn line and select the features selected before it.
+
+      Returns:
+        None
+      """
+      if self.tool is None or not self.tool.lines:
+        return
+      self.cancel_select_task()
+      self.reset_live_selection()
+      self.redo_lines.append(self.tool.pop_line())
+      self.restore_step(len(self.tool.lines))
+
+    def redo_line(self):
+      """
+      Draw the last removed line again and select the features selected after it.
+
+      Returns:
+        None
+      """
+      if self.tool is None or not self.redo_lines:
+        return
+      self.cancel_select_task()
+      self.reset_live_selection()
+      self.tool.push_line(self.redo_lines.pop())
+      self.restore_step(len(self.tool.lines))
+
+    def restore_step(self, position):
+      """
+      Select the features recorded after a number of drawn lines, without evaluating the lines again.
+
+      The evaluation of the lines drawn next continues from this selection.
+
+      Parameters:
+      - position (int): The number of drawn lines.
+
+      Returns:
+        None
+      """
+      self.pushButton_select_features.setEnabled(len(self.tool.lines) > 0)
+      self.update_history_buttons()
+      layer = QgsProject.instance().mapLayer(self.history_layer_id) if self.history is not None else None
+      ids = self.history.ids_at(position) if layer is not None else None
+      if ids is None:
+        self.iface.messageBar().pushMessage("Info", f"The selection after line {position} was not recorded.", level=Qgis.Info)
+        return
+      if commit_selection(layer, ids):
+        layer.triggerRepaint()
+
+      self.live_layer_id = layer.id()
+      self.live_initial_ids = ids
+      self.live_tolerance = self.layer_tolerance(layer)
+      self.live_lines = self.get_drawn_lines(layer)
+      self.live_done = position
+      self.live_ids = ids
+      self.label_live_status.setText(f"Line {position}: {len(ids)} selected")
+
+    def cancel_select_task(self):
+      """
+      Cancel the running selection tasks, if any.
+
+      Returns:
+        None
+      """
+      tasks = self.select_tasks
+      completed_tasks = self.completed_tasks
+      self.select_tasks = []
+      self.completed_tasks = []
+      for task in tasks:
+        # The task manager deletes the tasks once they completed
+        if task not in completed_tasks:
+          task.cancel()
+      self.progressBar_select.setVisible(False)
+      self.pushButton_cancel_select.setVisible(False)
+
+    def on_select_task_progress(self, task, progress):
+      """
+      Show the progress of the running selection tasks, averaged over the layers.
+
+      Parameters:
+      - task (SelectLinesTask): The task reporting its progress.
+      - progress (float): The progress, between 0 and 100.
+
+      Returns:
+        None
+      """
+      if task in self.select_tasks:
+        total = sum(100 if other in self.completed_tasks else other.progress() for other in self.select_tasks)
+        self.progressBar_select.setValue(int(total / len(self.select_tasks)))
+
+    def on_select_task_completed(self, task):
+      """
+      Collect the selection computed by a task and apply all of them once the last one completed.
+
+      Parameters:
+      - task (SelectLinesTask): The completed task.
+
+      Returns:
+        None
+      """
+      if task not in self.select_tasks:
+        # Replaced by a newer task
+        return
+      self.completed_tasks.append(task)
+      if len(self.completed_tasks) < len(self.select_tasks):
+        self.on_select_task_progress(task, 100)
+        return
+      tasks = self.select_tasks
+      self.select_tasks = []
+      self.completed_tasks = []
+      self.progressBar_select.setVisible(False)
+      self.pushButton_cancel_select.setVisible(False)
+
+      results = self.ready_results
+      for task in tasks:
+        layer = QgsProject.instance().mapLayer(task.layer_id)
+        if layer is None:
+          self.iface.messageBar().pushMessage("Error", f"Layer {task.layer_name} was removed.", level=Qgis.Warning)
+          continue
+        for step in task.result.step_stats:
+          QgsMessageLog.logMessage(f"{layer.name()}: {step['operation']} line, {step['intersecting']} intersecting features, {step['selected']} selected.", 'SelectLines', level=Qgis.Info)
+        if task.history is not None and self.history is not None and self.history_layer_id == task.layer_id:
+          self.history.extend(task.history)
+        results.append((layer, task.result_ids, task.stats))
+      self.apply_selections(results)
+
+    def apply_selections(self, results):
+      """
+      Select the computed features in their layers in one pass, on the main thread.
+
+      Parameters:
+      - results (list): Tuples of the layer (QgsVectorLayer), the IDs of the features to select (FidSet)
+        and the 'fetched' and 'tested' counters (dict), or None if nothing was read.
+
+      Returns:
+        None
+      """
+      for layer, set_of_ids_to_select, stats in results:
+        # Only the difference with the current selection is applied, in one call
+        if commit_selection(layer, set_of_ids_to_select):
+          # Refresh the layer to update the selection
+          layer.triggerRepaint()
+        if stats is not None:
+          QgsMessageLog.logMessage(f"{layer.name()}: fetched {stats['fetched']} features, tested {stats['tested']} features.", 'SelectLines', level=Qgis.Info)
+          if 'cache_hits' in stats:
+            QgsMessageLog.logMessage(f"{layer.name()}: line cache {stats['cache_hits']} hits, {stats['cache_misses']} misses.", 'SelectLines', level=Qgis.Info)
 
       # Provide feedback
-      self.iface.messageBar().pushMessage("Info", f"Selected {layer.selectedFeatureCount()} features.", level=Qgis.Info)
-      
+      if len(results) == 1:
+        self.iface.messageBar().pushMessage("Info", f"Selected {results[0][0].selectedFeatureCount()} features.", level=Qgis.Info)
+      elif results:
+        counts = ', '.join(f"{layer.name()}: {layer.selectedFeatureCount()}" for layer, _, _ in results)
+        self.iface.messageBar().pushMessage("Info", f"Selected features in {len(results)} layers ({counts}).", level=Qgis.Info)
+
       # Enable Disable buttons
       self.pushButton_select_features.setEnabled(False)
       self.init_manual_mode = False
       self.pushButton_draw_lines.setEnabled(True)
-        
 
+    def on_select_task_terminated(self, task):
+      """
+      Handle a selection task that was canceled or failed, the other layers are canceled with it.
+
+      Parameters:
+      - task (SelectLinesTask): The terminated task.
+
+      Returns:
+        None
+      """
+      if task not in self.select_tasks:
+        # Canceled because it was replaced by a newer task
+        return
+      self.cancel_select_task()
+      self.iface.messageBar().pushMessage("Info", "Selection canceled.", level=Qgis.Info)
 
     def init_manual(self):
       """
@@ -291,29 +832,21 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
         return
       
 
-      # Find the layer by its name
-      layer_check = QgsProject.instance().mapLayersByName(self.annotaiton_layer_name)
-      
-      # Check if the layer exists in the Table of Contents
-      if len(layer_check) == 0:
+      # Reset the state and variables
+      self.reset()
 
-        # Create a new annotation layer and add it to the project
-        self.annolayer = QgsAnnotationLayer(self.annotaiton_layer_name, QgsAnnotationLayer.LayerOptions(QgsProject.instance().transformContext()))
-        QgsProject.instance().addMapLayer(self.annolayer)
-        
-        # Make the annotaiton layer private that means invislbe in TOC
-        self.annolayer.setFlags(QgsMapLayer.Private)
-        
-        self.active_layer = self.iface.activeLayer()
-      else:
-        # Use the existing annotation layer
-        self.annolayer = layer_check[0]
+      # Get the annotation layer of the line numbers
+      self.annolayer = self.get_annotation_layer()
 
-        # Reset the state and variables
-        self.reset()
+      # The preview of the previous tool is replaced by the one of the new tool
+      if self.tool is not None:
+        self.tool.set_preview(None)
 
       # Create a new LineTool instance with the necessary parameters - most importantly it is in Manual mode
       self.tool = LineTool(self.iface.mapCanvas(), self.pushButton_reset_lines, self.pushButton_select_features, self.iface.activeLayer().crs(), self.annolayer, False)
+      self.tool.draw_mode = self.comboBox_draw_mode.currentData()
+      self.tool.lineDrawn.connect(self.on_line_drawn)
+      self.set_tool_preview()
   
       # Enable the buttons for adding, removing, and filtering lines
       self.init_manual_mode = True
@@ -380,25 +913,85 @@ class SelectLinesDialog(QtWidgets.QDockWidget, FORM_CLASS):
       self.iface.mapCanvas().setMapTool(self.tool)
       self.iface.mapCanvas().setCursor(QtCore.Qt.CrossCursor) 
 
-    def get_line_ids(self, layer, drawn_geometry):
+    def on_engine_changed(self, index):
+      """
+      Store the engine chosen in the combo box in the settings.
+
+      Parameters:
+      - index (int): The index of the chosen engine.
+
+      Returns:
+        None
+      """
+      QgsSettings().setValue(ENGINE_SETTING, self.comboBox_engine.itemData(index))
+
+    def on_draw_mode_changed(self, index):
+      """
+      Store the drawing mode chosen in the combo box and apply it to the tool.
+
+      Parameters:
+      - index (int): The index of the chosen drawing mode.
+
+      Returns:
+        None
+      """
+      draw_mode = self.comboBox_draw_mode.itemData(index)
+      QgsSettings().setValue(DRAW_MODE_SETTING, draw_mode)
+      if self.tool is not None:
+        # A line half drawn in the previous mode is dropped
+        self.tool.cancel_line()
+        self.tool.draw_mode = draw_mode
+
+    def on_tolerance_changed(self, value):
+      """
+      Store the tolerance chosen in the spin box and evaluate the drawn lines again with it.
+
+      Parameters:
+      - value (int): The tolerance, in screen pixels.
+
+      Returns:
+        None
+      """
+      QgsSettings().setValue(TOLERANCE_SETTING, value)
+      self.reset_live_selection()
+      self.set_tool_preview()
+
+    def layer_tolerance(self, layer):
+      """
+      Get the tolerance of the spin box in the units of a layer, at the current zoom.
+
+      Parameters:
+      - layer (QgsVectorLayer): The layer the lines are applied to.
+
+      Returns:
+      - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+      """
+      return pixels_to_layer_units(self.iface.mapCanvas().mapSettings(), layer, self.spinBox_tolerance.value())
+
+    def get_line_ids(self, layer, drawn_geometry, stats=None):
       """
       Get the IDs of lines in a layer that intersect with a given geometry.
       Parameters:
       - layer (QgsVectorLayer): The layer containing the lines.
       - drawn_geometry (QgsGeometry): The geometry to check for intersection.
+      - stats (dict): Optional counters, 'fetched' and 'tested' are incremented in place.
       Returns:
-      - intersecting_ids (set): A set of IDs of lines that intersect with the given geometry.
+      - intersecting_ids (FidSet): The IDs of the lines that intersect with the given geometry.
       """
-      intersecting_ids = set()
-      for feature in layer.getFeatures():
-          feature_geom = feature.geometry()
-          # Check if the feature's geometry intersects with the query geometry
-          if feature_geom.intersects(drawn_geometry):
-              intersecting_ids.add(feature.id())
-  
-      return intersecting_ids
+      engine_class = ENGINE_CLASSES.get(engine_for_layer(layer))
+      if engine_class is not None:
+        engine = cached_shapely_engine(layer, engine_class)
+        if engine is None:
+          engine = engine_class.from_source(layer, layer_spatial_index(layer).version)
+          store_shapely_engine(layer, engine)
+        return engine.get_lines_ids([drawn_geometry])[0]
+      return get_lines_ids(layer, [drawn_geometry], layer_candidate_lookup(layer), stats)[0]
     
 class LineTool(QgsMapTool):
+
+  # Emitted with the index of a line once it is drawn
+  lineDrawn = pyqtSignal(int)
+
   def __init__(self, canvas, reset_button, select_features_button, layer_crs, annolayer, automatic = True):
     self.canvas = canvas
     QgsMapTool.__init__(self, self.canvas)
@@ -406,33 +999,34 @@ class LineTool(QgsMapTool):
     self.automatic_mode = automatic
     # if automatic_mode is False, than we will use the self.operation attribute to determine the operation to be performed
     self.operation = 'none'
+    # 'line' for straight lines, 'polyline' to click the vertices or 'freehand' to sketch the line
+    self.draw_mode = 'line'
     self.layer_crs = layer_crs
     self.annolayer = annolayer 
+    # The drawn lines as records of their operation, vertices (map CRS) and annotation item ID
     self.lines = []
-    self.rubberBand_list = []
-    self.index_max = 25
+    # One rubber band per operation shows all its drawn lines, created on demand
+    self.rubber_bands = {}
+    # Rubber band of the line being drawn, created on demand
+    self.current_band = None
+    # Index of the line being drawn
+    self.index = -1
+    # When set, the next drawn line replaces the lines drawn so far
+    self.new_sequence = False
+    # Live preview of the features crossed by the line being drawn, if enabled
+    self.preview = None
     self.reset_button = reset_button
     self.select_features_button = select_features_button
     self.rb_config = {'add': {'color': QtCore.Qt.green, 'width': 4, 'secondary_color': QtCore.Qt.red, 'line_style': QtCore.Qt.SolidLine},
                                    'filter': {'color': QtCore.Qt.blue, 'width': 4, 'secondary_color': QtCore.Qt.red, 'line_style': QtCore.Qt.SolidLine},
                                    'remove': {'color': QtCore.Qt.gray, 'width': 4, 'secondary_color': QtCore.Qt.red, 'line_style': QtCore.Qt.SolidLine}}
-    for i in range(self.index_max):
-      rubberBand = QgsRubberBand(self.canvas, QgsWkbTypes.LineGeometry)
-      if i==0:
-         rubber_band_dict = {'operation':'add',
-                      'geom': rubberBand}
-      else:
-         rubber_band_dict = {'operation':'filter',
-                      'geom': rubberBand}       
-      self.rubberBand_list.append(rubber_band_dict)
-    self.index = -1
     self.reset()
     self.startPoints = []
     self.endPoints = []
 
   def removeRubberBands(self):
     """
-    Remove all rubber bands from the canvas.
+    Remove all rubber bands from the canvas and forget the drawn lines.
 
     This method removes all rubber bands (drawn lines) from the canvas scene.
 
@@ -442,23 +1036,106 @@ class LineTool(QgsMapTool):
     Returns:
       None
     """
-    for rubberBand in self.rubberBand_list:
-        self.canvas.scene().removeItem(rubberBand['geom'])
+    for rubberBand in self.rubber_bands.values():
+        self.canvas.scene().removeItem(rubberBand)
+    if self.current_band is not None:
+        self.canvas.scene().removeItem(self.current_band)
+    self.rubber_bands = {}
+    self.current_band = None
+    self.lines = []
+    self.index = -1
+    self.new_sequence = False
+    if self.preview is not None:
+        self.preview.clear()
+
+  def set_preview(self, preview):
+    """
+    Set the live preview of the features crossed by the line being drawn.
+
+    Parameters:
+    - preview (HitPreview): The preview, or None to turn it off.
+
+    Returns:
+      None
+    """
+    if self.preview is not None:
+      self.preview.remove()
+    self.preview = preview
+
+  def start_new_sequence(self):
+    """
+    Make the next drawn line start a new sequence, replacing the lines drawn so far.
+
+    Returns:
+      None
+    """
+    self.new_sequence = True
 
+  def line_geometry(self, line):
+    """
+    Get the geometry of a drawn line.
+
+    Parameters:
+    - line (dict): The record of the line.
+
+    Returns:
+    - QgsGeometry: The line, in the map CRS.
+    """
+    return QgsGeometry.fromPolylineXY(line['points'])
+
+  def line_operation(self, index):
+    """
+    Get the operation of the line drawn at an index.
+
+    Parameters:
+    - index (int): The index of the line.
+
+    Returns:
+    - operation (str): 'add', 'filter' or 'remove'.
+    """
+    if self.automatic_mode:
+      return 'add' if index == 0 else 'filter'
+    return self.operation
 
   def reset(self):
     """
     Reset the start and end points of the line selection.
 
-    This method sets the `startPoint` and `endPoint` attributes to `None` and
-    the `isEmittingPoint` attribute to `False`.
+    This method sets the `startPoint` and `endPoint` attributes to `None`, forgets the vertices
+    of the line being drawn and sets the `isEmittingPoint` attribute to `False`.
     """
     self.startPoint = self.endPoint = None
+    self.vertices = []
     self.isEmittingPoint = False
 
+  def drawing_points(self):
+    """
+    Get the vertices of the line being drawn, ending at the cursor.
+
+    Returns:
+    - points (list): The vertices (QgsPointXY), in the map CRS.
+    """
+    points = list(self.vertices)
+    if self.endPoint is not None and (not points or self.endPoint != points[-1]):
+      points.append(self.endPoint)
+    return points
+
+  def cancel_line(self):
+    """
+    Drop the line being drawn, e.g. on Escape.
+
+    Returns:
+      None
+    """
+    self.reset()
+    if self.preview is not None:
+      self.preview.clear()
+    if self.current_band is not None:
+      self.current_band.reset(QgsWkbTypes.LineGeometry)
+
   def canvasPressEvent(self, e):
     """
-    Handle the canvas press event, sets the reset and select features buttons to enabled if the index is less than the maximum index.
+    Handle the canvas press event, starts drawing the next line.
 
     Parameters:
       e (QMouseEvent): The mouse event object.
@@ -467,19 +1144,28 @@ class LineTool(QgsMapTool):
       None
     """
     if self.canvas.cursor().shape()!=0:
-      self.startPoint = self.toMapCoordinates(e.pos())
+      point = self.toMapCoordinates(e.pos())
+      if self.isEmittingPoint and self.draw_mode == 'polyline':
+        # Each click adds a vertex, a right click or a double click finishes the line
+        if e.button() == QtCore.Qt.RightButton:
+          self.finish_line()
+        elif point != self.vertices[-1]:
+          self.vertices.append(point)
+        return
+      if self.new_sequence:
+        for line in self.lines:
+          if line['annotation_id'] is not None:
+            self.annolayer.removeItem(line['annotation_id'])
+        self.removeRubberBands()
+      self.startPoint = point
       self.endPoint = self.startPoint
+      self.vertices = [point]
       self.isEmittingPoint = True
-      if self.index < self.index_max -1:
-        self.index += 1
-        self.reset_button.setEnabled(True)
-        self.select_features_button.setEnabled(True)
-      else:
-        self.index = 0
+      self.index = len(self.lines)
 
   def canvasReleaseEvent(self, e): 
     """
-    Handle the release event of the canvas.
+    Handle the release event of the canvas, records the drawn line.
 
     Parameters:
     e (QMouseEvent): The event object representing the release event.
@@ -488,8 +1174,120 @@ class LineTool(QgsMapTool):
     None
     """
     if self.canvas.cursor().shape()!=0:
-      self.isEmittingPoint = False
-      self.add_index_anottation(self.index, self.rubberBand_list[self.index]['geom'].asGeometry())
+      if not self.isEmittingPoint or self.draw_mode == 'polyline':
+        return
+      self.finish_line()
+
+  def canvasDoubleClickEvent(self, e):
+    """
+    Handle the double click event of the canvas, finishes a polyline.
+
+    Parameters:
+    e (QMouseEvent): The event object representing the double click.
+
+    Returns:
+    None
+    """
+    if self.canvas.cursor().shape()!=0 and self.isEmittingPoint and self.draw_mode == 'polyline':
+      self.finish_line()
+
+  def keyPressEvent(self, e):
+    """
+    Handle the key press event, Escape drops the line being drawn.
+
+    Parameters:
+    e (QKeyEvent): The event object representing the key press.
+
+    Returns:
+    None
+    """
+    if e.key() == QtCore.Qt.Key_Escape and self.isEmittingPoint:
+      self.cancel_line()
+
+  def finish_line(self):
+    """
+    Record the line being drawn.
+
+    Polylines and freehand strokes are simplified with Douglas-Peucker at a tolerance of
+    SIMPLIFY_TOLERANCE_PX screen pixels, so a sketched curve keeps only the vertices that change
+    its shape at the current zoom.
+
+    Returns:
+    None
+    """
+    self.isEmittingPoint = False
+    if self.preview is not None:
+      self.preview.clear()
+    if self.current_band is not None:
+      self.current_band.reset(QgsWkbTypes.LineGeometry)
+
+    points = self.drawing_points()
+    if self.draw_mode == 'line':
+      if self.startPoint.x() == self.endPoint.x() or self.startPoint.y() == self.endPoint.y():
+        # A click without a line
+        return
+    else:
+      geometry = QgsGeometry.fromPolylineXY(points).simplify(SIMPLIFY_TOLERANCE_PX * self.canvas.mapUnitsPerPixel())
+      points = geometry.asPolyline()
+      if len(points) < 2 or geometry.length() == 0:
+        # A click without a line
+        return
+
+    line = {'operation': self.line_operation(self.index),
+            'points': [QgsPointXY(point) for point in points],
+            'annotation_id': None}
+    self.push_line(line)
+
+    self.reset_button.setEnabled(True)
+    self.select_features_button.setEnabled(True)
+    self.lineDrawn.emit(self.index)
+
+  def push_line(self, line):
+    """
+    Record a line after the drawn lines and show it with its number.
+
+    Parameters:
+    - line (dict): The record of the line, its annotation item ID is replaced.
+
+    Returns:
+      None
+    """
+    index = len(self.lines)
+    geometry = self.line_geometry(line)
+    line['annotation_id'] = self.add_index_anottation(index, geometry)
+    self.lines.append(line)
+    self.index = index
+    self.new_sequence = False
+
+    # Batch the line with the other lines of its operation
+    operation = line['operation']
+    if operation not in self.rubber_bands:
+      self.rubber_bands[operation] = self._configure_rubberband(QgsRubberBand(self.canvas, QgsWkbTypes.LineGeometry), operation)
+    self.rubber_bands[operation].addGeometry(geometry)
+    self.rubber_bands[operation].show()
+
+  def pop_line(self):
+    """
+    Remove the last drawn line from the canvas, the next line continues the sequence.
+
+    Returns:
+    - line (dict): The record of the removed line.
+    """
+    line = self.lines.pop()
+    if line['annotation_id'] is not None:
+      self.annolayer.removeItem(line['annotation_id'])
+      line['annotation_id'] = None
+    self.index = len(self.lines) - 1
+    self.new_sequence = False
+
+    # Rebuild the rubber band of its operation from the remaining lines
+    band = self.rubber_bands.get(line['operation'])
+    if band is not None:
+      band.reset(QgsWkbTypes.LineGeometry)
+      for other in self.lines:
+        if other['operation'] == line['operation']:
+          band.addGeometry(self.line_geometry(other))
+    return line
 
     
 
@@ -505,54 +1303,54 @@ class LineTool(QgsMapTool):
 
     Description:
     This method is called when the cursor is moved int the canvas. It updates the end point of the line being drawn and shows the line on the canvas.
+    A freehand stroke gets a vertex every FREEHAND_STEP_PX pixels.
 
     """
     if self.canvas.cursor().shape()!=0:
       if not self.isEmittingPoint:
         return
       self.endPoint = self.toMapCoordinates(e.pos())
-      self.showLine(self.startPoint, self.endPoint)
+      if self.draw_mode == 'freehand':
+        last = self.toCanvasCoordinates(self.vertices[-1])
+        if (e.pos() - last).manhattanLength() >= FREEHAND_STEP_PX:
+          self.vertices.append(self.endPoint)
+      points = self.drawing_points()
+      self.showLine(points)
+      if self.preview is not None:
+        self.preview.update(points, e.pos())
 
   def _configure_rubberband(self, rubberBand, operation):
-    rubberBand['operation'] = operation
-    rubberBand['geom'].setColor(self.rb_config[operation]['color'])  
-    rubberBand['geom'].setWidth(self.rb_config[operation]['width'])
-    rubberBand['geom'].setSecondaryStrokeColor(self.rb_config[operation]['secondary_color'])
-    rubberBand['geom'].setLineStyle(self.rb_config[operation]['line_style'])
+    rubberBand.setColor(self.rb_config[operation]['color'])  
+    rubberBand.setWidth(self.rb_config[operation]['width'])
+    rubberBand.setSecondaryStrokeColor(self.rb_config[operation]['secondary_color'])
+    rubberBand.setLineStyle(self.rb_config[operation]['line_style'])
     return rubberBand
 
 
-  def showLine(self, startPoint, endPoint):
+  def showLine(self, points):
     """
-    Show the lines on the canvas between that were drawn by the rubber bands given start and end point.
+    Show the line being drawn on the canvas through the given points.
 
     Parameters:
-    - startPoint (QPointF): The starting point of the line.
-    - endPoint (QPointF): The ending point of the line.
+    - points (list): The vertices of the line (QgsPointXY), ending at the cursor.
 
     Returns:
     None
     """
-    if self.index <= self.index_max:
-      self.rubberBand_list[self.index]['geom'].reset(QgsWkbTypes.LineGeometry)
-    else:
-       return
-    if startPoint.x() == endPoint.x() or startPoint.y() == endPoint.y():
+    if self.current_band is None:
+      self.current_band = QgsRubberBand(self.canvas, QgsWkbTypes.LineGeometry)
+    self.current_band.reset(QgsWkbTypes.LineGeometry)
+    if len(points) < 2:
+      return
+    startPoint, endPoint = points[0], points[-1]
+    if self.draw_mode == 'line' and (startPoint.x() == endPoint.x() or startPoint.y() == endPoint.y()):
       return
 
-    point1 = QgsPointXY(startPoint.x(), startPoint.y())
-    point2 = QgsPointXY(endPoint.x(), endPoint.y())
-    if self.automatic_mode:
-      if self.index == 0:
-        self.rubberBand_list[self.index] = self._configure_rubberband(self.rubberBand_list[self.index], 'add')
-      else:
-        self.rubberBand_list[self.index] = self._configure_rubberband(self.rubberBand_list[self.index], 'filter')
-    else:
-      self.rubberBand_list[self.index] = self._configure_rubberband(self.rubberBand_list[self.index], self.operation)  
-  
-    self.rubberBand_list[self.index]['geom'].addPoint(point1, False)
-    self.rubberBand_list[self.index]['geom'].addPoint(point2, True) # true to update canvas  
-    self.rubberBand_list[self.index]['geom'].show()
+    self._configure_rubberband(self.current_band, self.line_operation(self.index))
+    for point in points[:-1]:
+      self.current_band.addPoint(QgsPointXY(point), False)
+    self.current_band.addPoint(QgsPointXY(endPoint), True) # true to update canvas  
+    self.current_band.show()
 
     
   def add_index_anottation(self, index, geom):
@@ -564,7 +1362,7 @@ class LineTool(QgsMapTool):
       - geom (QgsGeometry): The geometry representing the X,Y coordinate.
 
       Returns:
-      None
+      - item_id (str): The ID of the annotation item, or None if no annotation was added.
 
       Raises:
       None
@@ -592,11 +1390,13 @@ class LineTool(QgsMapTool):
         buffer_settings.setColor(QtCore.Qt.white)  # Color of the buffer
         text_format.setBuffer(buffer_settings)
         a.setFormat(text_format)
-        self.annolayer.addItem(a)
+        return self.annolayer.addItem(a)
+      return None
 
   def deactivate(self):
     """
-    Deactivates the QgsMapTool and emits the 'deactivated' signal.
+    Deactivates the QgsMapTool and emits the 'deactivated' signal, the line being drawn is dropped.
     """
+    self.cancel_line()
     QgsMapTool.deactivate(self)
     self.deactivated.emit()  
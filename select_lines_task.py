@@ -0,0 +1,290 @@
+"""
+****************************************************************
+ Select Lines - background selection task
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+import sqlite3
+
+from qgis.core import (Qgis, QgsFeatureSource, QgsFeedback, QgsMessageLog, QgsProject, QgsSettings, QgsTask,
+                       QgsVectorLayerFeatureSource)
+
+from .fid_set import FidSet
+from .segment_hash import SegmentHashEngine
+from .selection_engine import run_selection
+from .shapely_engine import (ENGINE_SETTING, ShapelyLayerEngine, cached_shapely_engine, engine_for_layer,
+                             store_shapely_engine)
+from .spatial_index import build_index, index_lookup, layer_spatial_index
+from .line_cache import layer_line_results
+from .selection_history import SelectionHistory
+from .postgis_backend import PostgisBackendUnavailable, postgis_backend_for_layer
+from .sqlite_backend import SqliteBackendUnavailable, sqlite_backend_for_layer
+
+# The engines that load the layer into memory, by name
+ENGINE_CLASSES = {'shapely': ShapelyLayerEngine, 'segments': SegmentHashEngine}
+
+
+class LayerSelectionJob:
+    """
+    The selection of a layer split in the parts that run on the main thread and in a worker thread.
+
+    The job is created on the main thread, where it takes a QgsVectorLayerFeatureSource snapshot of
+    the layer and picks up its cached index or Shapely engine. `run` only reads the snapshot and can
+    be called from any thread. `finish` hands an index or engine built by `run` over to the layer
+    cache, back on the main thread.
+    """
+
+    def __init__(self, layer, tolerance=0.0):
+        """
+        Initialize the job, on the main thread.
+
+        Parameters:
+        - layer (QgsVectorLayer): The layer to select the features from.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        None
+        """
+        self.layer_id = layer.id()
+        self.layer_name = layer.name()
+        self.source = QgsVectorLayerFeatureSource(layer)
+        self.tolerance = tolerance
+
+        # Results of the lines already evaluated on this version of the layer data, at this tolerance
+        self.line_results = layer_line_results(layer, tolerance)
+
+        # GeoPackage, SpatiaLite and PostGIS layers are answered by the database in automatic mode
+        self.database_backend = None
+        self.engine = None
+        if QgsSettings().value(ENGINE_SETTING, 'auto') == 'auto':
+            self.database_backend = sqlite_backend_for_layer(layer)
+            self.engine = 'sqlite'
+            if self.database_backend is None:
+                self.database_backend = postgis_backend_for_layer(layer)
+                self.engine = 'postgis'
+
+        # Large layers may be answered by the Shapely STRtree engine or the segment grid, loaded once
+        # per layer version
+        if self.database_backend is None:
+            self.engine = engine_for_layer(layer)
+        self.shapely_engine = None
+        self.built_shapely_engine = None
+        if self.engine in ENGINE_CLASSES:
+            self.shapely_engine = cached_shapely_engine(layer, ENGINE_CLASSES[self.engine])
+            self.engine_version = layer_spatial_index(layer).version
+
+        # Layers without a native spatial index share the cached per layer index
+        self.use_spatial_index = layer.hasSpatialIndex() == QgsFeatureSource.SpatialIndexNotPresent
+        self.candidate_lookup = None
+        self.index_version = None
+        self.index_cache_key = None
+        self.built_index = None
+        if self.use_spatial_index:
+            layer_index = layer_spatial_index(layer)
+            self.candidate_lookup = layer_index.lookup()
+            self.index_version = layer_index.version
+            self.index_cache_key = layer_index.cache_key()
+
+    def run(self, steps, initial_ids, feedback, history=None):
+        """
+        Compute the selected IDs from the snapshot, in any thread.
+
+        Parameters:
+        - steps (list): Tuples of drawn line (QgsGeometry, in the layer CRS) and operation
+          ('add', 'filter' or 'remove'), in order.
+        - initial_ids (set): The IDs selected before the first step.
+        - feedback (QgsFeedback): The feedback for progress reports and cancellation.
+        - history (SelectionHistory): Optional history the IDs selected after each step are appended to.
+
+        Returns:
+        - SelectionResult: The result, or None if canceled.
+        """
+        if self.database_backend is not None:
+            try:
+                result = self.database_backend.run_selection(steps, initial_ids, feedback, history, self.tolerance)
+                return None if result.canceled else result
+            except (SqliteBackendUnavailable, PostgisBackendUnavailable, sqlite3.Error) as e:
+                # Same result through the generic path, only slower
+                QgsMessageLog.logMessage(f"{self.layer_name}: {self.engine} selection not available ({e}), using GEOS.",
+                                         'SelectLines', level=Qgis.Info)
+                self.database_backend = None
+                if history is not None:
+                    history.truncate(history.start)
+
+        candidate_lookup = None
+        if self.engine in ENGINE_CLASSES:
+            if self.shapely_engine is None:
+                # Load the geometries from the snapshot, the engine is handed over to the layer once done
+                engine_class = ENGINE_CLASSES[self.engine]
+                self.built_shapely_engine = engine_class.from_source(self.source, self.engine_version, feedback)
+                self.shapely_engine = self.built_shapely_engine
+                if self.shapely_engine is None:
+                    return None
+        elif self.use_spatial_index:
+            if self.candidate_lookup is None:
+                # Build or load the missing index from the snapshot, it is handed over to the layer once done
+                self.built_index = build_index(self.source, self.index_cache_key, feedback)
+                if self.built_index is None:
+                    return None
+                self.candidate_lookup = index_lookup(*self.built_index)
+            candidate_lookup = self.candidate_lookup
+
+        if feedback.isCanceled():
+            return None
+        result = run_selection(self.source, steps, initial_ids, candidate_lookup, self.shapely_engine, feedback,
+                               self.line_results, history, self.tolerance)
+        if result.canceled:
+            return None
+        result.stats['cache_hits'] = self.line_results.hits
+        result.stats['cache_misses'] = self.line_results.misses
+        return result
+
+    def finish(self):
+        """
+        Hand the index or engine built by `run` over to the layer, on the main thread.
+
+        Returns:
+        None
+        """
+        layer = QgsProject.instance().mapLayer(self.layer_id)
+        if layer is None:
+            return
+        if self.built_index is not None:
+            layer_spatial_index(layer).adopt(self.built_index, self.index_version)
+        if self.built_shapely_engine is not None:
+            store_shapely_engine(layer, self.built_shapely_engine)
+
+
+class SelectLinesTask(QgsTask):
+    """
+    Background task computing the IDs selected by the drawn lines in a layer.
+
+    The task reads from a QgsVectorLayerFeatureSource snapshot taken when it is created, so the
+    layer itself is never touched outside the main thread. The resulting IDs are stored in
+    `result_ids`, applying them to the layer is left to the caller once the task completed.
+    """
+
+    def __init__(self, layer, steps, initial_ids, history_start=None, tolerance=0.0):
+        """
+        Initialize the task, on the main thread.
+
+        Parameters:
+        - layer (QgsVectorLayer): The layer to select the features from.
+        - steps (list): Tuples of drawn line (QgsGeometry, in the layer CRS) and operation
+          ('add', 'filter' or 'remove'), in drawing order.
+        - initial_ids (set): The IDs selected before the first drawn line.
+        - history_start (int): If given, the IDs selected after each step are recorded in `history`,
+          a SelectionHistory starting at this position.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        None
+        """
+        QgsTask.__init__(self, f"Select lines in {layer.name()}", QgsTask.CanCancel)
+        self.layer_id = layer.id()
+        self.layer_name = layer.name()
+        self.job = LayerSelectionJob(layer, tolerance)
+        self.engine = self.job.engine
+        self.steps = steps
+        self.initial_ids = FidSet(initial_ids)
+        self.history = SelectionHistory(history_start) if history_start is not None else None
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+
+        self.result = None
+        self.result_ids = None
+        self.stats = {'fetched': 0, 'tested': 0}
+
+    def run(self):
+        """
+        Compute the selected IDs, in the task manager thread.
+
+        Returns:
+        - bool: True if the selection was computed, False if the task was canceled.
+        """
+        self.result = self.job.run(self.steps, self.initial_ids, self.feedback, self.history)
+        if self.result is None or self.isCanceled():
+            return False
+        self.result_ids = self.result.selected_ids
+        self.stats = self.result.stats
+        return True
+
+    def cancel(self):
+        """
+        Cancel the task, stopping the feature iteration as soon as possible.
+        """
+        self.feedback.cancel()
+        QgsTask.cancel(self)
+
+    def finished(self, result):
+        """
+        Hand the index or engine built by the task over to the layer, on the main thread.
+
+        Parameters:
+        - result (bool): The value returned by run.
+
+        Returns:
+        None
+        """
+        if result:
+            self.job.finish()
+
+
+class BuildIndexTask(QgsTask):
+    """
+    Background task building the cached spatial index of a layer, from a snapshot of the layer.
+    """
+
+    def __init__(self, layer):
+        """
+        Initialize the task, on the main thread.
+
+        Parameters:
+        - layer (QgsVectorLayer): The layer to index.
+
+        Returns:
+        None
+        """
+        QgsTask.__init__(self, f"Index {layer.name()}", QgsTask.CanCancel)
+        self.layer_id = layer.id()
+        self.source = QgsVectorLayerFeatureSource(layer)
+        layer_index = layer_spatial_index(layer)
+        self.index_version = layer_index.version
+        self.index_cache_key = layer_index.cache_key()
+        self.feedback = QgsFeedback()
+        self.feedback.progressChanged.connect(self.setProgress)
+        self.built_index = None
+
+    def run(self):
+        """
+        Build or load the index, in the task manager thread.
+
+        Returns:
+        - bool: True if the index was built, False if the task was canceled.
+        """
+        self.built_index = build_index(self.source, self.index_cache_key, self.feedback)
+        return self.built_index is not None and not self.isCanceled()
+
+    def cancel(self):
+        """
+        Cancel the task, stopping the feature iteration as soon as possible.
+        """
+        self.feedback.cancel()
+        QgsTask.cancel(self)
+
+    def finished(self, result):
+        """
+        Hand the index over to the layer, on the main thread.
+
+        Parameters:
+        - result (bool): The value returned by run.
+
+        Returns:
+        None
+        """
+        layer = QgsProject.instance().mapLayer(self.layer_id)
+        if result and layer is not None:
+            layer_spatial_index(layer).adopt(self.built_index, self.index_version)
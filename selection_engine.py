@@ -0,0 +1,513 @@
+"""
+****************************************************************
+ Select Lines - intersection engine
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+The selection algebra of the plugin, independent of the dock, the map tool and
+iface, so it can run from scripts, batch jobs and benchmarks:
+
+    from SelectLines.selection_engine import commit_selection, run_selection
+    result = run_selection(layer, [(line_1, 'add'), (line_2, 'filter')], layer.selectedFeatureIds())
+    commit_selection(layer, result.selected_ids)
+
+The drawn geometries must be in the layer CRS. With a tolerance, in layer units,
+features within that distance of a drawn line count as crossed:
+
+    result = run_selection(layer, steps, tolerance=pixels_to_layer_units(canvas.mapSettings(), layer, 4))
+"""
+import math
+
+from qgis.core import (QgsCoordinateTransform, QgsCsException, QgsFeatureRequest, QgsFeatureSource, QgsGeometry,
+                       QgsPointXY, QgsProject, QgsRectangle, QgsVectorLayer, QgsWkbTypes)
+
+from .fid_set import FidSet
+from .spatial_index import layer_spatial_index
+
+# Index lookups of one drawn line at most, the segments of longer lines are searched in runs
+MAX_SEGMENT_LOOKUPS = 256
+
+# Features read before their membership in the candidate sets is looked up in one go
+FEATURE_BATCH = 1000
+
+# Settings key of the distance, in screen pixels, within which a feature counts as crossed
+TOLERANCE_SETTING = 'select_lines/tolerance_px'
+
+
+def prepared_geometry_engine(geometry):
+    """
+    Create a prepared GEOS engine for a geometry, for fast repeated predicate tests.
+
+    Parameters:
+    - geometry (QgsGeometry): The geometry to prepare, it must outlive the engine.
+
+    Returns:
+    - engine (QgsGeometryEngine): The prepared engine.
+    """
+    engine = QgsGeometry.createGeometryEngine(geometry.constGet())
+    engine.prepareGeometry()
+    return engine
+
+
+def pixels_to_layer_units(map_settings, layer, pixels):
+    """
+    Convert a distance in screen pixels at the current map scale to layer units.
+
+    The distance is measured eastwards from the center of the visible extent, after transforming
+    both ends to the layer CRS.
+
+    Parameters:
+    - map_settings (QgsMapSettings): The settings of the map canvas.
+    - layer (QgsVectorLayer): The layer.
+    - pixels (float): The distance in pixels.
+
+    Returns:
+    - distance (float): The distance in layer units, 0 for no tolerance.
+    """
+    distance = pixels * map_settings.mapUnitsPerPixel()
+    if distance <= 0:
+        return 0.0
+    center = map_settings.visibleExtent().center()
+    transform = QgsCoordinateTransform(map_settings.destinationCrs(), layer.crs(),
+                                       QgsProject.instance().transformContext())
+    try:
+        start = transform.transform(center)
+        end = transform.transform(QgsPointXY(center.x() + distance, center.y()))
+    except QgsCsException:
+        return distance
+    return start.distance(end)
+
+
+def line_search_rectangles(drawn_geometry, tolerance=0.0, max_lookups=MAX_SEGMENT_LOOKUPS):
+    """
+    Get the rectangles to search the candidates of a drawn line in, one per segment.
+
+    The box of a long bent line, such as a polyline or freehand stroke, covers far more features
+    than the line passes near; the boxes of its segments do not. Lines with more than
+    `max_lookups` segments are searched in runs of consecutive segments.
+
+    With a tolerance the rectangles are grown by it, so only the search window of the drawn line
+    gets larger and the features themselves are never buffered.
+
+    Parameters:
+    - drawn_geometry (QgsGeometry): The drawn line.
+    - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+    - max_lookups (int): The maximal number of rectangles.
+
+    Returns:
+    - rectangles (list): The search rectangles (QgsRectangle), the box of the line for straight
+      lines and geometries other than a single linestring.
+    """
+    bbox = drawn_geometry.boundingBox()
+    # Horizontal and vertical segments have a flat box, which some providers take for no filter
+    margin = max(tolerance, max(bbox.width(), bbox.height()) * 1e-9)
+    if QgsWkbTypes.flatType(drawn_geometry.wkbType()) != QgsWkbTypes.LineString:
+        return [bbox.buffered(margin)]
+    points = drawn_geometry.asPolyline()
+    if len(points) <= 2:
+        return [bbox.buffered(margin)]
+
+    step = math.ceil((len(points) - 1) / max_lookups)
+    rectangles = []
+    for start in range(0, len(points) - 1, step):
+        run = points[start:start + step + 1]
+        xs = [point.x() for point in run]
+        ys = [point.y() for point in run]
+        rectangle = QgsRectangle(min(xs), min(ys), max(xs), max(ys))
+        rectangle.grow(margin)
+        rectangles.append(rectangle)
+    return rectangles
+
+
+def line_candidates(drawn_geometry, candidate_lookup, tolerance=0.0, limit=None, max_lookups=MAX_SEGMENT_LOOKUPS):
+    """
+    Get the candidate IDs of a drawn line, searched segment by segment.
+
+    Parameters:
+    - drawn_geometry (QgsGeometry): The drawn line.
+    - candidate_lookup (callable): Function from a QgsRectangle to a list of candidate IDs.
+    - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+    - limit (int): Optional number of candidates above which the search stops, the lookup is
+      expected to return at most `limit + 1` IDs per rectangle.
+    - max_lookups (int): The maximal number of lookups, see `line_search_rectangles`.
+
+    Returns:
+    - candidate_ids (FidSet): The IDs of the features whose box touches a segment box, more than
+      `limit` of them, but not all, if the search stopped.
+    """
+    candidate_ids = []
+    for rectangle in line_search_rectangles(drawn_geometry, tolerance, max_lookups):
+        candidate_ids.extend(candidate_lookup(rectangle))
+        if limit is not None and len(candidate_ids) > limit:
+            # The runs of a line overlap, only stop on the number of distinct IDs
+            candidate_ids = list(set(candidate_ids))
+            if len(candidate_ids) > limit:
+                break
+    return FidSet(candidate_ids)
+
+
+def provider_candidate_lookup(source, limit=None):
+    """
+    Build a candidate lookup that pushes the search rectangle down to the data provider.
+
+    Providers with a native spatial index (shapefile .qix, GeoPackage rtree, SpatiaLite, PostGIS)
+    do the search without decoding geometries or attributes.
+
+    Parameters:
+    - source (QgsAbstractFeatureSource): The layer or feature source snapshot to search.
+    - limit (int): Optional maximal number of IDs the lookup returns, passed on to the provider.
+
+    Returns:
+    - lookup (callable): Function from a QgsRectangle to a list of candidate IDs.
+    """
+    def lookup(rectangle):
+        request = QgsFeatureRequest().setFilterRect(rectangle).setNoAttributes().setFlags(QgsFeatureRequest.NoGeometry)
+        if limit is not None:
+            request.setLimit(limit)
+        return [feature.id() for feature in source.getFeatures(request)]
+    return lookup
+
+
+def layer_candidate_lookup(layer, limit=None):
+    """
+    Build the candidate lookup to use for a layer, on the main thread.
+
+    Layers whose provider has no native spatial index use the cached per layer spatial index,
+    the other layers push the search rectangle down to the provider.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer to search.
+    - limit (int): Optional maximal number of IDs the lookup returns.
+
+    Returns:
+    - lookup (callable): Function from a QgsRectangle to a list of candidate IDs.
+    """
+    if layer.hasSpatialIndex() == QgsFeatureSource.SpatialIndexNotPresent:
+        layer_index = layer_spatial_index(layer)
+        if limit is None:
+            return layer_index.candidates
+
+        def lookup(rectangle):
+            return layer_index.candidates(rectangle, limit)
+        return lookup
+    return provider_candidate_lookup(layer, limit)
+
+
+def get_lines_ids(source, drawn_geometries, candidate_lookup, stats=None, feedback=None, operations=None, initial_ids=(),
+                  line_results=None, tolerance=0.0):
+    """
+    Get, for each drawn geometry, the IDs of the lines in a source that intersect with it.
+
+    The candidates of all the drawn geometries are collected first, then every candidate feature
+    is read once, without attributes, and tested against the prepared engine of each drawn
+    geometry whose bounding box it touches. Reading the source therefore costs the same for 1 or
+    25 drawn lines.
+
+    The candidates of a polyline or freehand line are searched segment by segment, see
+    `line_search_rectangles`.
+
+    When the operations are given, 'filter' and 'remove' lines can only change features that are
+    already in the working set, so they are only tested against the features that may be in it at
+    that step (the initial IDs and the candidates of the preceding 'add' lines), instead of
+    searching the whole source. Their sets are then restricted to those features, which is all
+    that `apply_operations` needs.
+
+    With a line result cache, the lines answered by the cache are neither searched nor tested, and
+    the others are stored in it once computed.
+
+    With a tolerance, the search windows of the drawn lines are grown by it and the candidates are
+    tested with a distance predicate instead of `intersects`, see `line_search_rectangles`.
+
+    Parameters:
+    - source (QgsAbstractFeatureSource): The layer or feature source snapshot containing the lines.
+    - drawn_geometries (list): The geometries (QgsGeometry) to check for intersection, in the source CRS.
+    - candidate_lookup (callable): Function from a QgsRectangle to a list of candidate IDs.
+    - stats (dict): Optional counters, 'fetched' and 'tested' are incremented in place and 'candidates'
+      is set to the number of candidates of each drawn geometry.
+    - feedback (QgsFeedback): Optional feedback for progress reports and cancellation.
+    - operations (list): Optional operation ('add', 'filter' or 'remove') of each drawn geometry.
+    - initial_ids (iterable): The IDs selected before the first operation, used with the operations.
+    - line_results (LayerLineResults): Optional cache of the results of drawn lines on the layer,
+      for the same tolerance.
+    - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+    Returns:
+    - intersecting_ids (list): A FidSet of intersecting IDs for each drawn geometry, in the same order.
+      The sets are incomplete if the feedback was canceled.
+    """
+    if stats is None:
+        stats = {'fetched': 0, 'tested': 0}
+    if operations is None:
+        operations = ['add'] * len(drawn_geometries)
+    # The hits are collected in lists and turned into FidSets once, never into Python sets
+    intersecting_ids = [None] * len(drawn_geometries)
+    hits_lists = [[] for _ in drawn_geometries]
+
+    # Prepare each drawn line once, so GEOS does not rebuild its structures on every comparison
+    drawn_engines = [prepared_geometry_engine(drawn_geometry) for drawn_geometry in drawn_geometries]
+    drawn_bboxes = [drawn_geometry.boundingBox() for drawn_geometry in drawn_geometries]
+    if tolerance > 0:
+        drawn_bboxes = [bbox.buffered(tolerance) for bbox in drawn_bboxes]
+
+    # The features that may be in the working set grow only with the 'add' lines. The set is frozen
+    # after each 'add' line and shared by the 'filter' and 'remove' lines that follow it.
+    reachable_ids = FidSet(initial_ids)
+    candidate_sets = []
+    cached = [False] * len(drawn_geometries)
+    for i, operation in enumerate(operations):
+        universe = None if operation == 'add' else reachable_ids
+        hits = line_results.get(drawn_geometries[i], universe) if line_results is not None else None
+        if hits is not None:
+            # Answered by the cache, an 'add' line only brings in the features it intersects
+            intersecting_ids[i] = hits
+            cached[i] = True
+            if operation == 'add':
+                reachable_ids = reachable_ids | hits
+            candidate_sets.append(FidSet())
+            continue
+        if operation == 'add':
+            candidate_ids = line_candidates(drawn_geometries[i], candidate_lookup, tolerance)
+            reachable_ids = reachable_ids | candidate_ids
+        else:
+            candidate_ids = reachable_ids
+        candidate_sets.append(candidate_ids)
+    stats['candidates'] = [len(candidate_ids) for candidate_ids in candidate_sets]
+    all_candidates = FidSet.union_all(candidate_sets)
+    if not all_candidates:
+        intersecting_ids = [FidSet() if hits is None else hits for hits in intersecting_ids]
+        store_line_results(line_results, drawn_geometries, operations, intersecting_ids, candidate_sets, cached)
+        return intersecting_ids
+
+    # Read every candidate once, geometry only, and test the features batch by batch
+    request = QgsFeatureRequest().setFilterFids(all_candidates.tolist()).setNoAttributes()
+    if feedback is not None:
+        request.setFeedback(feedback)
+    total = len(all_candidates)
+    batch = []
+    for feature in source.getFeatures(request):
+        stats['fetched'] += 1
+        if feedback is not None and stats['fetched'] % 1000 == 0:
+            if feedback.isCanceled():
+                break
+            feedback.setProgress(100.0 * stats['fetched'] / total)
+        feature_geom = feature.geometry()
+        if feature_geom.isNull():
+            continue
+        batch.append((feature.id(), feature_geom))
+        if len(batch) == FEATURE_BATCH:
+            test_feature_batch(batch, candidate_sets, drawn_engines, drawn_bboxes, tolerance, hits_lists, stats)
+            batch = []
+    test_feature_batch(batch, candidate_sets, drawn_engines, drawn_bboxes, tolerance, hits_lists, stats)
+
+    intersecting_ids = [FidSet(hits_list) if hits is None else hits
+                        for hits, hits_list in zip(intersecting_ids, hits_lists)]
+    if feedback is None or not feedback.isCanceled():
+        store_line_results(line_results, drawn_geometries, operations, intersecting_ids, candidate_sets, cached)
+    return intersecting_ids
+
+
+def test_feature_batch(batch, candidate_sets, drawn_engines, drawn_bboxes, tolerance, hits_lists, stats):
+    """
+    Test a batch of features against the drawn geometries whose candidates they are.
+
+    The membership of the batch in each distinct candidate set is looked up once, with a vectorized
+    search in the sorted IDs, instead of one lookup per feature and drawn geometry.
+
+    Parameters:
+    - batch (list): Tuples of feature ID and geometry (QgsGeometry).
+    - candidate_sets (list): The FidSet of candidates of each drawn geometry.
+    - drawn_engines (list): The prepared engine of each drawn geometry.
+    - drawn_bboxes (list): The search window (QgsRectangle) of each drawn geometry.
+    - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+    - hits_lists (list): The list of intersecting IDs of each drawn geometry, extended in place.
+    - stats (dict): The counters, 'tested' is incremented in place.
+
+    Returns:
+    None
+    """
+    if not batch:
+        return
+    fids = [fid for fid, _ in batch]
+    # The 'filter' and 'remove' lines after the same 'add' line share their candidate set
+    memberships = {}
+    for candidate_ids in candidate_sets:
+        if id(candidate_ids) not in memberships:
+            memberships[id(candidate_ids)] = candidate_ids.contains(fids)
+    found = [memberships[id(candidate_ids)] for candidate_ids in candidate_sets]
+    for j, (fid, feature_geom) in enumerate(batch):
+        feature_bbox = feature_geom.boundingBox()
+        for i, drawn_engine in enumerate(drawn_engines):
+            # Skip the exact test for drawn lines that are not even close to the feature
+            if not found[i][j] or not feature_bbox.intersects(drawn_bboxes[i]):
+                continue
+            stats['tested'] += 1
+            # Check if the feature's geometry intersects with the query geometry, or is close enough to it
+            if tolerance > 0:
+                hit = drawn_engine.distanceWithin(feature_geom.constGet(), tolerance)
+            else:
+                hit = drawn_engine.intersects(feature_geom.constGet())
+            if hit:
+                hits_lists[i].append(fid)
+
+
+def store_line_results(line_results, drawn_geometries, operations, intersecting_ids, candidate_sets, cached):
+    """
+    Store the results of the drawn lines that were computed, with the features they were tested against.
+
+    Parameters:
+    - line_results (LayerLineResults): The cache of the layer, or None.
+    - drawn_geometries (list): The drawn geometries (QgsGeometry).
+    - operations (list): The operation of each drawn geometry.
+    - intersecting_ids (list): The FidSet of intersecting IDs of each drawn geometry.
+    - candidate_sets (list): The FidSet of features each drawn geometry was tested against.
+    - cached (list): True for the drawn geometries answered by the cache.
+
+    Returns:
+    None
+    """
+    if line_results is None:
+        return
+    for drawn_geometry, operation, lines_intersect_ids, candidate_ids, from_cache in \
+            zip(drawn_geometries, operations, intersecting_ids, candidate_sets, cached):
+        if not from_cache:
+            line_results.put(drawn_geometry, lines_intersect_ids, None if operation == 'add' else candidate_ids)
+
+
+def apply_operations(initial_ids, operations, intersecting_ids, step_stats=None, history=None):
+    """
+    Apply the add/filter/remove operations to a set of IDs, in order.
+
+    The working set is a FidSet, so each operation is a vectorized merge of sorted ID arrays.
+
+    Parameters:
+    - initial_ids (iterable): The IDs selected before the first operation.
+    - operations (list): The operations ('add', 'filter' or 'remove') of the drawn lines.
+    - intersecting_ids (list): The set of IDs intersecting each drawn line, in the same order.
+    - step_stats (list): Optional list the number of IDs selected after each operation is appended to.
+    - history (SelectionHistory): Optional history the IDs selected after each operation are appended to.
+
+    Returns:
+    - set_of_ids_to_select (FidSet): The IDs selected after the last operation.
+    """
+    set_of_ids_to_select = FidSet(initial_ids)
+    for operation, lines_intersect_ids in zip(operations, intersecting_ids):
+        previous_ids = set_of_ids_to_select
+        if operation == 'add':
+            set_of_ids_to_select = set_of_ids_to_select | lines_intersect_ids
+        elif operation == 'filter':
+            set_of_ids_to_select = set_of_ids_to_select & lines_intersect_ids
+        else:
+            set_of_ids_to_select = set_of_ids_to_select - lines_intersect_ids
+        if step_stats is not None:
+            step_stats.append(len(set_of_ids_to_select))
+        if history is not None:
+            history.append(set_of_ids_to_select, previous_ids)
+    return set_of_ids_to_select
+
+
+def commit_selection(layer, selected_ids):
+    """
+    Make a set of IDs the selection of a layer, changing only the IDs that differ.
+
+    The difference with the current selection is applied with a single modifySelection call, so
+    selectionChanged is emitted once with the changed IDs only, and not at all if nothing changed.
+    This is where the IDs are converted to Python ints for QGIS.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer, on the main thread.
+    - selected_ids (FidSet): The IDs to select, or any iterable of IDs.
+
+    Returns:
+    - changed (bool): True if the selection changed.
+    """
+    selected_ids = FidSet(selected_ids)
+    current_ids = FidSet(layer.selectedFeatureIds())
+    select_ids = selected_ids - current_ids
+    deselect_ids = current_ids - selected_ids
+    if not select_ids and not deselect_ids:
+        return False
+    layer.modifySelection(select_ids.tolist(), deselect_ids.tolist())
+    return True
+
+
+class SelectionResult:
+    """
+    The outcome of `run_selection`.
+
+    Attributes:
+    - selected_ids (FidSet): The IDs selected after the last step, None if canceled.
+    - step_stats (list): For each step a dict with its 'operation', the number of 'candidates' tested
+      (None when not known), the number of 'intersecting' features and the number 'selected' after it.
+    - stats (dict): The 'fetched' and 'tested' feature counters of the whole run.
+    - canceled (bool): True if the run was canceled through its feedback.
+    """
+
+    def __init__(self, selected_ids, step_stats, stats, canceled=False):
+        self.selected_ids = selected_ids
+        self.step_stats = step_stats
+        self.stats = stats
+        self.canceled = canceled
+
+
+def run_selection(source, steps, initial_ids=(), candidate_lookup=None, shapely_engine=None, feedback=None,
+                  line_results=None, history=None, tolerance=0.0):
+    """
+    Apply a sequence of drawn lines and their operations to a set of feature IDs.
+
+    Parameters:
+    - source (QgsAbstractFeatureSource): The layer, or a feature source snapshot when run outside the
+      main thread.
+    - steps (list): Tuples of drawn geometry (QgsGeometry, in the source CRS) and operation
+      ('add', 'filter' or 'remove'), in order.
+    - initial_ids (iterable): The IDs selected before the first step.
+    - candidate_lookup (callable): Optional function from a QgsRectangle to a list of candidate IDs.
+      Defaults to `layer_candidate_lookup` for a layer and to the provider search for other sources.
+    - shapely_engine (ShapelyLayerEngine): Optional engine answering the steps instead of GEOS, or a
+      SegmentHashEngine.
+    - feedback (QgsFeedback): Optional feedback for progress reports and cancellation.
+    - line_results (LayerLineResults): Optional cache of the results of drawn lines on the layer,
+      for the same tolerance.
+    - history (SelectionHistory): Optional history the IDs selected after each step are appended to.
+    - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+    Returns:
+    - SelectionResult: The selected IDs and the statistics of each step.
+    """
+    drawn_geometries = [drawn_geometry for drawn_geometry, _ in steps]
+    operations = [operation for _, operation in steps]
+    initial_ids = FidSet(initial_ids)
+    stats = {'fetched': 0, 'tested': 0}
+
+    if shapely_engine is not None:
+        # The engine tests the whole layer, so its results are stored for any later operation
+        intersecting_ids = [line_results.get(drawn_geometry) if line_results is not None else None
+                            for drawn_geometry in drawn_geometries]
+        missing = [i for i, hits in enumerate(intersecting_ids) if hits is None]
+        missing_hits = shapely_engine.get_lines_ids([drawn_geometries[i] for i in missing], tolerance)
+        for i, hits in zip(missing, missing_hits):
+            intersecting_ids[i] = hits
+            if line_results is not None:
+                line_results.put(drawn_geometries[i], hits)
+        stats['candidates'] = [None] * len(steps)
+    else:
+        if candidate_lookup is None:
+            if isinstance(source, QgsVectorLayer):
+                candidate_lookup = layer_candidate_lookup(source)
+            else:
+                candidate_lookup = provider_candidate_lookup(source)
+        intersecting_ids = get_lines_ids(source, drawn_geometries, candidate_lookup, stats, feedback,
+                                         operations, initial_ids, line_results, tolerance)
+    candidates = stats.pop('candidates', [None] * len(steps))
+    if feedback is not None and feedback.isCanceled():
+        return SelectionResult(None, [], stats, True)
+
+    selected_counts = []
+    selected_ids = apply_operations(initial_ids, operations, intersecting_ids, selected_counts, history)
+    step_stats = [{'operation': operation, 'candidates': candidate_count, 'intersecting': len(lines_intersect_ids),
+                   'selected': selected_count}
+                  for operation, candidate_count, lines_intersect_ids, selected_count
+                  in zip(operations, candidates, intersecting_ids, selected_counts)]
+    return SelectionResult(selected_ids, step_stats, stats)
@@ -0,0 +1,123 @@
+"""
+****************************************************************
+ Select Lines - compact history of the selection steps
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+from .fid_set import FidSet
+
+# Every this many steps the whole set is stored, the steps in between only store what changed
+KEYFRAME_INTERVAL = 10
+
+
+class SelectionHistory:
+    """
+    The selected IDs after each step of a sequence of drawn lines, stored compactly.
+
+    Position 0 holds the selection before the first line and position n the selection after the
+    n-th line. A keyframe holds the whole set and the other positions only the IDs added and
+    removed since the previous position, each packed by `FidSet.pack`, so reading a position decodes
+    one keyframe and at most KEYFRAME_INTERVAL small deltas.
+
+    A history recorded in a background task starts at the position it continues from, and is
+    appended to the history of the panel with `extend`.
+    """
+
+    def __init__(self, start=0):
+        """
+        Initialize an empty history.
+
+        Parameters:
+        - start (int): The position of the first step recorded.
+
+        Returns:
+        None
+        """
+        self.start = start
+        self.snapshots = []
+
+    def __len__(self):
+        """
+        Get the position following the last recorded step.
+        """
+        return self.start + len(self.snapshots)
+
+    def append(self, ids, previous_ids=None):
+        """
+        Record the selection after the next step.
+
+        Parameters:
+        - ids (FidSet): The selected IDs, or any iterable of IDs.
+        - previous_ids (FidSet): The IDs selected at the previous position, None if unknown.
+
+        Returns:
+        None
+        """
+        ids = FidSet(ids)
+        if previous_ids is None or len(self) % KEYFRAME_INTERVAL == 0:
+            self.snapshots.append((ids.pack(), None))
+        else:
+            previous_ids = FidSet(previous_ids)
+            self.snapshots.append(((ids - previous_ids).pack(), (previous_ids - ids).pack()))
+
+    def extend(self, other):
+        """
+        Append the steps of a history that continues this one.
+
+        Parameters:
+        - other (SelectionHistory): The history starting at the position following this one.
+
+        Returns:
+        - bool: True if the steps were appended, False if the histories do not follow each other.
+        """
+        if other.start != len(self):
+            return False
+        self.snapshots.extend(other.snapshots)
+        return True
+
+    def truncate(self, length):
+        """
+        Forget the positions from a position on, e.g. when a line is drawn after an undo.
+
+        Parameters:
+        - length (int): The first position to forget.
+
+        Returns:
+        None
+        """
+        del self.snapshots[max(0, length - self.start):]
+
+    def ids_at(self, position):
+        """
+        Get the selected IDs at a position.
+
+        Parameters:
+        - position (int): The position, between `start` and `len(self) - 1`.
+
+        Returns:
+        - ids (FidSet): The selected IDs, or None if the position is not recorded.
+        """
+        index = position - self.start
+        if index < 0 or index >= len(self.snapshots):
+            return None
+        keyframe = index
+        while self.snapshots[keyframe][1] is not None:
+            keyframe -= 1
+            if keyframe < 0:
+                return None
+        ids = FidSet.unpack(self.snapshots[keyframe][0])
+        for added, removed in self.snapshots[keyframe + 1:index + 1]:
+            ids = (ids - FidSet.unpack(removed)) | FidSet.unpack(added)
+        return ids
+
+    def nbytes(self):
+        """
+        Get the memory used by the packed snapshots.
+
+        Returns:
+        - int: The number of bytes.
+        """
+        return sum(len(added) + (len(removed) if removed is not None else 0) for added, removed in self.snapshots)
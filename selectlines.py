@@ -27,7 +27,12 @@ from qgis.core import *
 from qgis.gui import *
 from qgis.utils import *
 from .resources_rc import *
+from .line_cache import clear_line_cache
+from .postgis_backend import close_postgis_pools
+from .processing_provider import SelectLinesProvider
 from .select_lines_dialog import SelectLinesDialog
+from .shapely_engine import clear_shapely_engines
+from .spatial_index import clear_layer_spatial_indexes
 
 # Import the code for the dialog
 import os.path
@@ -38,8 +43,15 @@ class SelectLines:
         self.plugin_dir = os.path.dirname(__file__)
         self.pluginIsActive = False
         self.dockwidget = None
+        self.provider = None
+
+    def initProcessing(self):
+        self.provider = SelectLinesProvider()
+        QgsApplication.processingRegistry().addProvider(self.provider)
 
     def initGui(self):
+        self.initProcessing()
+
         self.panelAction = QtWidgets.QAction(QtGui.QIcon(":/plugins/selectlines/icon.png"),u"SelectLines", self.iface.mainWindow())
         self.panelAction.triggered.connect(self.run)
         self.panelAction.setCheckable(True)
@@ -51,6 +63,12 @@ class SelectLines:
     def unload(self):
         self.iface.removePluginMenu(u"&SelectLines", self.panelAction)
         self.iface.removeToolBarIcon(self.panelAction)
+        if self.provider is not None:
+            QgsApplication.processingRegistry().removeProvider(self.provider)
+        clear_layer_spatial_indexes()
+        clear_shapely_engines()
+        close_postgis_pools()
+        clear_line_cache()
    
     def widgetVisibilityChanged(self, visible: bool) -> None:
         self.panelAction.setChecked(visible)
@@ -0,0 +1,210 @@
+"""
+****************************************************************
+ Select Lines - Shapely STRtree engine
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+from qgis.core import QgsFeatureRequest, QgsSettings, QgsWkbTypes
+
+from .fid_set import HAS_NUMPY, FidSet
+from .spatial_index import layer_spatial_index
+
+try:
+    import numpy as np
+    import shapely
+    HAS_SHAPELY = int(shapely.__version__.split('.')[0]) >= 2
+except ImportError:
+    HAS_SHAPELY = False
+
+# Settings keys of the engine choice
+ENGINE_SETTING = 'select_lines/engine'
+THRESHOLD_SETTING = 'select_lines/shapely_threshold'
+
+# Below this number of features, loading the layer into Shapely costs more than it saves
+DEFAULT_SHAPELY_THRESHOLD = 200000
+
+
+def geometry_wkb(geometry):
+    """
+    Get the WKB of a geometry, in a form Shapely reads the same way GEOS sees it in QGIS.
+
+    Curves are segmentized and M values dropped, as QGIS does when it hands a geometry to GEOS.
+
+    Parameters:
+    - geometry (QgsGeometry): The geometry.
+
+    Returns:
+    - wkb (bytes): The WKB of the geometry.
+    """
+    abstract_geometry = geometry.constGet()
+    wkb_type = abstract_geometry.wkbType()
+    if QgsWkbTypes.isCurvedType(wkb_type):
+        abstract_geometry = abstract_geometry.segmentize()
+    elif QgsWkbTypes.hasM(wkb_type):
+        abstract_geometry = abstract_geometry.clone()
+    if QgsWkbTypes.hasM(wkb_type):
+        abstract_geometry.dropMValue()
+    return bytes(abstract_geometry.asWkb())
+
+
+class ShapelyLayerEngine:
+    """
+    The geometries of a layer loaded once into a Shapely 2 array, with an STRtree over them.
+
+    Each drawn line is answered with a single bulk `STRtree.query(..., predicate='intersects')`,
+    which runs in GEOS without a Python loop over the features.
+    """
+
+    def __init__(self, fids, geometries, version):
+        """
+        Initialize the engine.
+
+        Parameters:
+        - fids (numpy.ndarray): The feature IDs, int64.
+        - geometries (numpy.ndarray): The Shapely geometries, in the same order.
+        - version (int): The layer version counter the geometries were read at.
+
+        Returns:
+        None
+        """
+        self.fids = fids
+        self.geometries = geometries
+        self.tree = shapely.STRtree(geometries)
+        self.version = version
+
+    @classmethod
+    def from_source(cls, source, version, feedback=None):
+        """
+        Load the geometries of a layer or feature source snapshot.
+
+        Parameters:
+        - source (QgsAbstractFeatureSource): The layer or feature source snapshot.
+        - version (int): The layer version counter when the snapshot was taken.
+        - feedback (QgsFeedback): Optional feedback for cancellation.
+
+        Returns:
+        - ShapelyLayerEngine: The engine, or None if the feedback was canceled.
+        """
+        fids = []
+        wkbs = []
+        request = QgsFeatureRequest().setNoAttributes()
+        if feedback is not None:
+            request.setFeedback(feedback)
+        for feature in source.getFeatures(request):
+            feature_geom = feature.geometry()
+            if feature_geom.isNull():
+                continue
+            fids.append(feature.id())
+            wkbs.append(geometry_wkb(feature_geom))
+        if feedback is not None and feedback.isCanceled():
+            return None
+        return cls(np.array(fids, dtype=np.int64), shapely.from_wkb(np.array(wkbs, dtype=object)), version)
+
+    def get_lines_ids(self, drawn_geometries, tolerance=0.0):
+        """
+        Get, for each drawn geometry, the IDs of the features that intersect with it.
+
+        Parameters:
+        - drawn_geometries (list): The geometries (QgsGeometry) to check for intersection, in the layer CRS.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+          The tree is then queried with the 'dwithin' predicate, which grows the search window of
+          the drawn geometry only.
+
+        Returns:
+        - intersecting_ids (list): A FidSet of intersecting IDs for each drawn geometry, in the same order.
+        """
+        intersecting_ids = []
+        for drawn_geometry in drawn_geometries:
+            drawn_shape = shapely.from_wkb(geometry_wkb(drawn_geometry))
+            if tolerance > 0:
+                hits = self.tree.query(drawn_shape, predicate='dwithin', distance=tolerance)
+            else:
+                hits = self.tree.query(drawn_shape, predicate='intersects')
+            intersecting_ids.append(FidSet(self.fids[hits]))
+        return intersecting_ids
+
+
+# Engines kept per layer ID, reused as long as the layer data did not change
+_layer_engines = {}
+
+
+def engine_for_layer(layer):
+    """
+    Choose the engine to use for a layer from the settings.
+
+    The setting is 'auto', 'geos', 'shapely' or 'segments'. In automatic mode layers with at least
+    the threshold number of features use Shapely when Shapely 2 is installed, and GEOS otherwise;
+    the segment grid tests the segments with its own floating point predicate, which may decide
+    touching and collinear features differently from GEOS, so it is only used when chosen. An
+    engine that is not available falls back to GEOS: Shapely needs Shapely 2, and the segment grid
+    NumPy and a line layer.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer to select the features from.
+
+    Returns:
+    - engine (str): 'shapely', 'segments' or 'geos'.
+    """
+    settings = QgsSettings()
+    preference = settings.value(ENGINE_SETTING, 'auto')
+    has_segments = HAS_NUMPY and layer.geometryType() == QgsWkbTypes.LineGeometry
+    if preference == 'auto':
+        threshold = settings.value(THRESHOLD_SETTING, DEFAULT_SHAPELY_THRESHOLD, type=int)
+        if layer.featureCount() < threshold:
+            return 'geos'
+        preference = 'shapely'
+    if preference == 'shapely' and HAS_SHAPELY:
+        return 'shapely'
+    if preference == 'segments' and has_segments:
+        return 'segments'
+    return 'geos'
+
+
+def cached_shapely_engine(layer, engine_class=ShapelyLayerEngine):
+    """
+    Get the cached engine of a layer, if it is still up to date.
+
+    A layer keeps a single engine, the Shapely engine or the segment grid.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer.
+    - engine_class (type): The class of the engine, ShapelyLayerEngine or SegmentHashEngine.
+
+    Returns:
+    - engine: The engine, or None if it has to be (re)built.
+    """
+    engine = _layer_engines.get(layer.id())
+    if isinstance(engine, engine_class) and engine.version == layer_spatial_index(layer).version:
+        return engine
+    return None
+
+
+def store_shapely_engine(layer, engine):
+    """
+    Keep an engine for later clicks, if the layer did not change since it was loaded.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer.
+    - engine (ShapelyLayerEngine): The engine built from a snapshot of the layer, or a SegmentHashEngine.
+
+    Returns:
+    None
+    """
+    if engine.version != layer_spatial_index(layer).version:
+        return
+    if layer.id() not in _layer_engines:
+        layer.willBeDeleted.connect(lambda layer_id=layer.id(): _layer_engines.pop(layer_id, None))
+    _layer_engines[layer.id()] = engine
+
+
+def clear_shapely_engines():
+    """
+    Drop all cached engines, used when the plugin is unloaded.
+
+    Returns:
+    None
+    """
+    _layer_engines.clear()
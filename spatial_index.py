@@ -0,0 +1,331 @@
+"""
+****************************************************************
+ Select Lines - per layer spatial index cache
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+"""
+import itertools
+from array import array
+
+from qgis.core import QgsFeatureRequest, QgsSpatialIndex
+
+from .index_cache import PackedRTree, layer_cache_key, load_cached_tree, store_cached_tree
+
+# Source of the version counters, unique across layers and across indexes of the same layer ID
+_versions = itertools.count(1)
+
+
+class LayerSpatialIndex:
+    """
+    Spatial index of the feature bounding boxes of a single vector layer.
+
+    The index is built lazily on the first query and is afterwards kept up to date
+    from the layer's edit signals instead of being rebuilt. Entries are only ever
+    added: a changed geometry gets a second entry and a deleted feature is masked out,
+    so a query may return a few stale candidates but never misses a feature. The
+    exact intersection test that follows removes the stale ones.
+
+    For layers read from a local file, the bounding boxes are kept in a packed R-tree
+    cached on disk and memory mapped in later sessions, and the QgsSpatialIndex only
+    holds the edits made on top of it.
+    """
+
+    def __init__(self, layer):
+        """
+        Initialize the index for a layer and connect to its edit signals.
+
+        Parameters:
+        - layer (QgsVectorLayer): The layer to index.
+
+        Returns:
+        None
+        """
+        self.layer = layer
+        self.layer_id = layer.id()
+        # The whole index, or only the edits on top of the cached base tree
+        self.index = None
+        self.base = None
+        self.deleted_ids = set()
+
+        # Counter of data changes, bumped on every geometry, feature or provider data change
+        self.version = next(_versions)
+
+        self.layer.featureAdded.connect(self._feature_added)
+        self.layer.featureDeleted.connect(self._feature_deleted)
+        self.layer.geometryChanged.connect(self._geometry_changed)
+        self.layer.dataChanged.connect(self._data_changed)
+        self.layer.committedFeaturesAdded.connect(self._committed_features_added)
+        self.layer.committedFeaturesRemoved.connect(self._committed_features_removed)
+        self.layer.committedGeometriesChanges.connect(self._committed_geometries_changes)
+        self.layer.subsetStringChanged.connect(self.invalidate)
+        self.layer.dataSourceChanged.connect(self.invalidate)
+
+    def disconnect(self):
+        """
+        Disconnect from the layer signals and drop the index.
+
+        Returns:
+        None
+        """
+        for signal, slot in ((self.layer.featureAdded, self._feature_added),
+                             (self.layer.featureDeleted, self._feature_deleted),
+                             (self.layer.geometryChanged, self._geometry_changed),
+                             (self.layer.dataChanged, self._data_changed),
+                             (self.layer.committedFeaturesAdded, self._committed_features_added),
+                             (self.layer.committedFeaturesRemoved, self._committed_features_removed),
+                             (self.layer.committedGeometriesChanges, self._committed_geometries_changes),
+                             (self.layer.subsetStringChanged, self.invalidate),
+                             (self.layer.dataSourceChanged, self.invalidate)):
+            try:
+                signal.disconnect(slot)
+            except (TypeError, RuntimeError):
+                # Already disconnected or the layer is being deleted
+                pass
+        self.index = None
+        self.base = None
+
+    def invalidate(self):
+        """
+        Drop the index so that it is rebuilt on the next query.
+
+        Used when the set of features changes wholesale (new subset string or data source).
+
+        Returns:
+        None
+        """
+        self.index = None
+        self.base = None
+        self.deleted_ids = set()
+        self.version = next(_versions)
+
+    def cache_key(self):
+        """
+        Get the key of the on disk cache of the layer.
+
+        Returns:
+        - key (str): The key, or None if the layer can not be cached, e.g. it has uncommitted edits.
+        """
+        if self.layer.isModified():
+            return None
+        return layer_cache_key(self.layer)
+
+    def adopt(self, parts, version):
+        """
+        Use an index built elsewhere, e.g. by a background task on a feature source snapshot.
+
+        The index is only adopted if none was built meanwhile and the layer data did not change
+        since the snapshot was taken.
+
+        Parameters:
+        - parts (tuple): The base tree and the QgsSpatialIndex, as returned by `build_index`.
+        - version (int): The value of the version counter when the snapshot was taken.
+
+        Returns:
+        None
+        """
+        if self.index is None and self.version == version:
+            self.base, self.index = parts
+            self.deleted_ids = set()
+
+    def lookup(self):
+        """
+        Get a candidate lookup over the current state of the index.
+
+        The lookup can be used from a background task, the QgsSpatialIndex guards its tree with
+        a mutex and the base tree is never modified.
+
+        Returns:
+        - lookup (callable): Function from a QgsRectangle to a list of candidate IDs, or None if
+          the index was not built yet.
+        """
+        if self.index is None:
+            return None
+        return index_lookup(self.base, self.index, set(self.deleted_ids))
+
+    def candidates(self, rectangle, limit=None):
+        """
+        Get the IDs of the features whose bounding box intersects a rectangle.
+
+        Parameters:
+        - rectangle (QgsRectangle): The search rectangle in layer coordinates.
+        - limit (int): Optional maximal number of IDs to return.
+
+        Returns:
+        - candidate_ids (list): IDs of the candidate features.
+        """
+        if self.index is None:
+            self.base, self.index = build_index(self.layer, self.cache_key())
+            self.deleted_ids = set()
+        return index_lookup(self.base, self.index, self.deleted_ids, limit)(rectangle)
+
+    def _insert(self, fid, geometry):
+        """
+        Insert a bounding box for a feature ID, if the index has been built already.
+        """
+        if self.index is None or geometry is None or geometry.isNull():
+            return
+        self.index.addFeature(fid, geometry.boundingBox())
+        self.deleted_ids.discard(fid)
+
+    def _feature_added(self, fid):
+        self.version = next(_versions)
+        if self.index is None:
+            return
+        feature = self.layer.getFeature(fid)
+        if feature.isValid():
+            self._insert(fid, feature.geometry())
+
+    def _feature_deleted(self, fid):
+        self.version = next(_versions)
+        if self.index is not None:
+            self.deleted_ids.add(fid)
+
+    def _geometry_changed(self, fid, geometry):
+        self.version = next(_versions)
+        self._insert(fid, geometry)
+
+    def _committed_features_added(self, layer_id, features):
+        self.version = next(_versions)
+        # Committed features get their final, provider assigned IDs
+        for feature in features:
+            self._insert(feature.id(), feature.geometry())
+
+    def _committed_features_removed(self, layer_id, fids):
+        self.version = next(_versions)
+
+    def _committed_geometries_changes(self, layer_id, changed_geometries):
+        self.version = next(_versions)
+        for fid, geometry in changed_geometries.items():
+            self._insert(fid, geometry)
+
+    def _data_changed(self):
+        # The edits of an edit session are followed by the slots above, attribute edits change no
+        # result; only the changes made outside of one, e.g. a reload of the provider, count here
+        if not self.layer.isEditable():
+            self.version = next(_versions)
+
+
+def build_index(source, cache_key=None, feedback=None):
+    """
+    Build the index of a layer or feature source snapshot, without fetching attributes.
+
+    With a cache key, the packed R-tree is loaded from the on disk cache, or built and stored
+    there, and an empty QgsSpatialIndex is returned to hold the later edits. Otherwise the
+    QgsSpatialIndex is bulk loaded with all the features.
+
+    Parameters:
+    - source (QgsAbstractFeatureSource): The layer or feature source snapshot.
+    - cache_key (str): The key of the on disk cache, or None to keep the index in memory only.
+    - feedback (QgsFeedback): Optional feedback for cancellation.
+
+    Returns:
+    - parts (tuple): The base PackedRTree (or None) and the QgsSpatialIndex, or None if canceled.
+    """
+    request = QgsFeatureRequest().setNoAttributes()
+    if feedback is not None:
+        request.setFeedback(feedback)
+
+    if cache_key is None:
+        index = QgsSpatialIndex(source.getFeatures(request), feedback)
+        if feedback is not None and feedback.isCanceled():
+            return None
+        return None, index
+
+    base = load_cached_tree(cache_key)
+    if base is None:
+        fids = array('q')
+        bounds = array('d')
+        for feature in source.getFeatures(request):
+            feature_geom = feature.geometry()
+            if feature_geom.isNull():
+                continue
+            bbox = feature_geom.boundingBox()
+            fids.append(feature.id())
+            bounds.extend((bbox.xMinimum(), bbox.yMinimum(), bbox.xMaximum(), bbox.yMaximum()))
+        if feedback is not None and feedback.isCanceled():
+            return None
+        base = PackedRTree.build(fids, bounds)
+        store_cached_tree(cache_key, base)
+    return base, QgsSpatialIndex()
+
+
+def index_lookup(base, index, deleted_ids=(), limit=None):
+    """
+    Build a candidate lookup over a base tree and a QgsSpatialIndex.
+
+    Parameters:
+    - base (PackedRTree): The base tree, or None.
+    - index (QgsSpatialIndex): The index of the feature bounding boxes, or of the edits on top of the base.
+    - deleted_ids (set): IDs still in the index that must not be returned.
+    - limit (int): Optional maximal number of IDs the lookup returns, the base tree search stops there.
+
+    Returns:
+    - lookup (callable): Function from a QgsRectangle to a list of candidate IDs.
+    """
+    def lookup(rectangle):
+        candidate_ids = index.intersects(rectangle)
+        if base is not None:
+            # The deleted IDs are dropped afterwards, so the tree may have to return that many more
+            base_limit = None if limit is None else max(0, limit - len(candidate_ids)) + len(deleted_ids)
+            if base_limit != 0:
+                candidate_ids.extend(base.query(rectangle.xMinimum(), rectangle.yMinimum(),
+                                                rectangle.xMaximum(), rectangle.yMaximum(), base_limit))
+        if deleted_ids:
+            candidate_ids = [fid for fid in candidate_ids if fid not in deleted_ids]
+        if limit is not None:
+            del candidate_ids[limit:]
+        return candidate_ids
+    return lookup
+
+
+# Indexes kept per layer ID, shared across clicks and plugin sessions
+_layer_indexes = {}
+
+
+def layer_spatial_index(layer):
+    """
+    Get the cached spatial index of a layer, creating it on first use.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer to index.
+
+    Returns:
+    - LayerSpatialIndex: The index of the layer.
+    """
+    layer_index = _layer_indexes.get(layer.id())
+    if layer_index is None or layer_index.layer is not layer:
+        if layer_index is not None:
+            layer_index.disconnect()
+        layer_index = LayerSpatialIndex(layer)
+        _layer_indexes[layer.id()] = layer_index
+        layer.willBeDeleted.connect(lambda layer_id=layer.id(): release_layer_spatial_index(layer_id))
+    return layer_index
+
+
+def release_layer_spatial_index(layer_id):
+    """
+    Drop the cached spatial index of a layer.
+
+    Parameters:
+    - layer_id (str): The ID of the layer.
+
+    Returns:
+    None
+    """
+    layer_index = _layer_indexes.pop(layer_id, None)
+    if layer_index is not None:
+        layer_index.disconnect()
+
+
+def clear_layer_spatial_indexes():
+    """
+    Drop all cached spatial indexes, used when the plugin is unloaded.
+
+    Returns:
+    None
+    """
+    for layer_id in list(_layer_indexes):
+        release_layer_spatial_index(layer_id)
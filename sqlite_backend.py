@@ -0,0 +1,241 @@
+"""
+****************************************************************
+ Select Lines - GeoPackage and SpatiaLite SQL backend
+                              -------------------
+        begin                : 2026-10-18
+        copyright            : Shai Sussman
+        email                : shai.sussman@gmail.com
+****************************************************************
+
+For GeoPackage and SpatiaLite layers the whole sequence of drawn lines is sent
+to the database as one compound SELECT. Each line is answered by joining the
+R*Tree of the layer for the bounding box search with ST_Intersects from
+SpatiaLite for the exact test, and the lines are chained with UNION (add),
+INTERSECT (filter) and EXCEPT (remove). SQLite evaluates compound operators
+left to right, which is the order the lines were drawn in. Only the selected
+feature IDs are returned to Python.
+"""
+import os
+import pathlib
+import sqlite3
+
+from qgis.core import QgsDataSourceUri, QgsProviderRegistry
+
+from .fid_set import FidSet
+from .selection_engine import SelectionResult
+from .shapely_engine import geometry_wkb
+
+# SQLite refuses compound SELECTs with more terms (SQLITE_MAX_COMPOUND_SELECT defaults to 500)
+MAX_COMPOUND_STEPS = 250
+
+# Number of SQLite virtual machine instructions between cancellation checks
+PROGRESS_INSTRUCTIONS = 10000
+
+COMPOUND_OPERATORS = {'add': 'UNION', 'filter': 'INTERSECT', 'remove': 'EXCEPT'}
+
+
+class SqliteBackendUnavailable(Exception):
+    """
+    Raised when a layer can not be answered in SQL, the generic path is used instead.
+    """
+
+
+def quote_identifier(name):
+    """
+    Quote a table or column name for SQLite.
+
+    Parameters:
+    - name (str): The name.
+
+    Returns:
+    - quoted (str): The quoted name.
+    """
+    return '"{}"'.format(name.replace('"', '""'))
+
+
+class SqliteSelectionBackend:
+    """
+    Runs the drawn lines of a GeoPackage or SpatiaLite layer in the database.
+
+    The backend only holds the location of the table, the connection is opened by `run_selection`
+    in the thread it runs in.
+    """
+
+    def __init__(self, path, table, geometry_column, file_format):
+        """
+        Initialize the backend.
+
+        Parameters:
+        - path (str): The path of the database file.
+        - table (str): The name of the table of the layer.
+        - geometry_column (str): The name of the geometry column, None to look it up.
+        - file_format (str): 'gpkg' or 'spatialite'.
+
+        Returns:
+        None
+        """
+        self.path = path
+        self.table = table
+        self.geometry_column = geometry_column
+        self.file_format = file_format
+
+    def connect(self):
+        """
+        Open the database read only and load SpatiaLite.
+
+        Returns:
+        - connection (sqlite3.Connection): The connection.
+        """
+        # As a URI, so characters such as '?', '#' or '%' in the path are escaped
+        connection = sqlite3.connect(pathlib.Path(self.path).absolute().as_uri() + '?mode=ro', uri=True)
+        try:
+            connection.enable_load_extension(True)
+            connection.load_extension('mod_spatialite')
+            connection.enable_load_extension(False)
+        except (AttributeError, sqlite3.Error) as e:
+            connection.close()
+            raise SqliteBackendUnavailable(f"SpatiaLite can not be loaded: {e}")
+        return connection
+
+    def table_sql(self, connection, tolerance=0.0):
+        """
+        Build the SELECT answering one drawn line, from the layer metadata.
+
+        Parameters:
+        - connection (sqlite3.Connection): The open connection.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        - sql (str): The SELECT, with the bounding box of the drawn line, grown by the tolerance, and
+          its WKB as parameters, followed by the tolerance when there is one.
+        """
+        if self.file_format == 'gpkg':
+            row = connection.execute(
+                "SELECT column_name, srs_id FROM gpkg_geometry_columns WHERE lower(table_name) = lower(?)",
+                (self.table,)).fetchone()
+            if row is None:
+                raise SqliteBackendUnavailable(f"{self.table} is not a GeoPackage feature table")
+            geometry_column, srid = row
+            rtree = f"rtree_{self.table}_{geometry_column}"
+            rtree_columns = ('id', 'minx', 'maxx', 'miny', 'maxy')
+            geometry = f"GeomFromGPB(t.{quote_identifier(geometry_column)})"
+        else:
+            row = connection.execute(
+                "SELECT f_geometry_column, srid FROM geometry_columns WHERE lower(f_table_name) = lower(?) "
+                "AND (? IS NULL OR lower(f_geometry_column) = lower(?))",
+                (self.table, self.geometry_column, self.geometry_column)).fetchone()
+            if row is None:
+                raise SqliteBackendUnavailable(f"{self.table} is not a SpatiaLite geometry table")
+            geometry_column, srid = row
+            rtree = f"idx_{self.table}_{geometry_column}"
+            rtree_columns = ('pkid', 'xmin', 'xmax', 'ymin', 'ymax')
+            geometry = f"t.{quote_identifier(geometry_column)}"
+
+        if connection.execute("SELECT 1 FROM sqlite_master WHERE lower(name) = lower(?)", (rtree,)).fetchone() is None:
+            raise SqliteBackendUnavailable(f"{self.table} has no spatial index")
+        rtree_id, minx, maxx, miny, maxy = rtree_columns
+        if tolerance > 0:
+            predicate = f"ST_Distance({geometry}, GeomFromWKB(?, {int(srid)})) <= ?"
+        else:
+            predicate = f"ST_Intersects({geometry}, GeomFromWKB(?, {int(srid)})) = 1"
+        return (f"SELECT t.ROWID FROM {quote_identifier(self.table)} t "
+                f"JOIN {quote_identifier(rtree)} r ON r.{rtree_id} = t.ROWID "
+                f"WHERE r.{minx} <= ? AND r.{maxx} >= ? AND r.{miny} <= ? AND r.{maxy} >= ? "
+                f"AND {predicate}")
+
+    def run_selection(self, steps, initial_ids=(), feedback=None, history=None, tolerance=0.0):
+        """
+        Apply a sequence of drawn lines and their operations in the database.
+
+        With a tolerance the R*Tree window of each line is grown by it and ST_Distance replaces
+        ST_Intersects, so the features themselves are never buffered.
+
+        Parameters:
+        - steps (list): Tuples of drawn geometry (QgsGeometry, in the layer CRS) and operation
+          ('add', 'filter' or 'remove'), in order.
+        - initial_ids (iterable): The IDs selected before the first step.
+        - feedback (QgsFeedback): Optional feedback for progress reports and cancellation.
+        - history (SelectionHistory): Optional history the IDs selected after each step are appended
+          to, each line is then sent as its own query.
+        - tolerance (float): The distance within which a feature counts as crossed, in layer units.
+
+        Returns:
+        - SelectionResult: The selected IDs. The database only returns the final set, so there are
+          no per step statistics.
+
+        Raises:
+        - SqliteBackendUnavailable: If the layer can not be answered in SQL.
+        """
+        connection = self.connect()
+        try:
+            if feedback is not None:
+                connection.set_progress_handler(lambda: 1 if feedback.isCanceled() else 0, PROGRESS_INSTRUCTIONS)
+            line_sql = self.table_sql(connection, tolerance)
+            connection.execute("CREATE TEMP TABLE selected_ids (fid INTEGER PRIMARY KEY)")
+            connection.executemany("INSERT INTO selected_ids VALUES (?)", ((fid,) for fid in initial_ids))
+
+            selected_ids = FidSet(initial_ids)
+            chunk_size = 1 if history is not None else MAX_COMPOUND_STEPS
+            for start in range(0, len(steps), chunk_size):
+                chunk = steps[start:start + chunk_size]
+                sql = ["SELECT fid FROM selected_ids"]
+                parameters = []
+                for drawn_geometry, operation in chunk:
+                    box = drawn_geometry.boundingBox()
+                    if tolerance > 0:
+                        box = box.buffered(tolerance)
+                    sql.append(f"{COMPOUND_OPERATORS[operation]} {line_sql}")
+                    parameters.extend((box.xMaximum(), box.xMinimum(), box.yMaximum(), box.yMinimum(),
+                                       geometry_wkb(drawn_geometry)))
+                    if tolerance > 0:
+                        parameters.append(tolerance)
+                previous_ids = selected_ids
+                selected_ids = FidSet(fid for fid, in connection.execute(' '.join(sql), parameters))
+                if history is not None:
+                    history.append(selected_ids, previous_ids)
+
+                if start + chunk_size < len(steps):
+                    # The next chunk continues from this selection
+                    connection.execute("DELETE FROM selected_ids")
+                    connection.executemany("INSERT INTO selected_ids VALUES (?)", ((fid,) for fid in selected_ids))
+                if feedback is not None:
+                    feedback.setProgress(100 * min(start + chunk_size, len(steps)) / len(steps))
+        except sqlite3.OperationalError:
+            if feedback is not None and feedback.isCanceled():
+                return SelectionResult(None, [], {'fetched': 0, 'tested': 0}, True)
+            raise
+        finally:
+            connection.close()
+        # The features were tested in the database, only the selected IDs were fetched
+        return SelectionResult(selected_ids, [], {'fetched': len(selected_ids), 'tested': 0})
+
+
+def sqlite_backend_for_layer(layer):
+    """
+    Get the SQL backend of a layer, on the main thread.
+
+    GeoPackage layers read by the OGR provider and SpatiaLite layers qualify, unless the layer has
+    a subset string or unsaved edits, which the database does not see.
+
+    Parameters:
+    - layer (QgsVectorLayer): The layer.
+
+    Returns:
+    - SqliteSelectionBackend: The backend, or None if the layer has to use the generic path.
+    """
+    if layer.subsetString() or layer.isModified():
+        return None
+    provider = layer.providerType()
+    if provider == 'ogr':
+        parts = QgsProviderRegistry.instance().decodeUri(provider, layer.source())
+        path = parts.get('path') or ''
+        table = parts.get('layerName')
+        if not path.lower().endswith('.gpkg') or not table or not os.path.isfile(path):
+            return None
+        return SqliteSelectionBackend(path, table, None, 'gpkg')
+    if provider == 'spatialite':
+        uri = QgsDataSourceUri(layer.source())
+        if not uri.table() or uri.table().startswith('(') or not os.path.isfile(uri.database()):
+            return None
+        return SqliteSelectionBackend(uri.database(), uri.table(), uri.geometryColumn() or None, 'spatialite')
+    return None